@@ -0,0 +1,76 @@
+import argparse
+import json
+import time
+
+import sync
+from benchmark_render import generate_blocks, make_rich_text
+
+
+def make_query_response(count):
+    """构造一页数据库查询响应：每行带标题、状态、日期、关联和汇总等属性"""
+    rows = []
+    for i in range(count):
+        rows.append({
+            'object': 'page',
+            'id': f'{i:032x}',
+            'created_time': '2024-01-01T00:00:00.000Z',
+            'last_edited_time': '2024-03-18T08:30:00.000Z',
+            'parent': {'type': 'database_id', 'database_id': 'f' * 32},
+            'properties': {
+                'Name': {'id': 'title', 'type': 'title', 'title': make_rich_text(f'笔记 {i} notion github sync')},
+                'Status': {'id': 'st', 'type': 'status', 'status': {'id': 'x', 'name': 'Reading', 'color': 'blue'}},
+                'Full Date': {'id': 'dt', 'type': 'date', 'date': {'start': '2024-03-18', 'end': None}},
+                'Related': {'id': 'rl', 'type': 'relation', 'relation': [{'id': f'{j:032x}'} for j in range(10)]},
+                'Total': {'id': 'ro', 'type': 'rollup', 'rollup': {'type': 'array', 'array': [
+                    {'type': 'number', 'number': j} for j in range(10)]}}
+            },
+            'url': f'https://www.notion.so/{i:032x}'
+        })
+    return {'object': 'list', 'results': rows, 'has_more': True, 'next_cursor': 'cursor'}
+
+
+def make_payloads():
+    """真实规模的负载：块列表响应、数据库查询响应、映射表和块缓存"""
+    blocks = generate_blocks(100, nested=True)
+    return {
+        '块列表响应(100块)': {'object': 'list', 'results': blocks, 'has_more': False, 'next_cursor': None},
+        '数据库查询响应(100行)': make_query_response(100),
+        '映射表(1万页)': {f'{i:032x}': f'notes/数据库/分类/页面_{i}.md' for i in range(10000)},
+        '块缓存(2千块)': {'version': 4, 'blocks': {
+            f'{i:032x}': {'edited': '2024-03-18T08:30:00.000Z', 'hash': f'{i:040x}', 'markdown': '- 笔记内容 ' * 20}
+            for i in range(2000)}}
+    }
+
+
+def best_of(repeat, func):
+    """重复执行 repeat 次，返回最快一次的耗时"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='JSON编解码基准测试（标准库 vs orjson）')
+    parser.add_argument('--repeat', type=int, default=20, help='每项重复次数（取最快一次）')
+    args = parser.parse_args()
+
+    backends = ['json'] + (['orjson'] if sync.orjson is not None else [])
+    if len(backends) == 1:
+        print("未安装 orjson，只测试标准库")
+
+    print(f"{'负载':<22} {'大小(KB)':>9} {'后端':>7} {'解码(ms)':>9} {'编码(ms)':>9}")
+    for name, payload in make_payloads().items():
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        for backend in backends:
+            sync.use_orjson = backend == 'orjson'
+            decode = best_of(args.repeat, lambda: sync.json_loads(data))
+            encode = best_of(args.repeat, lambda: sync.json_dumps(payload))
+            print(f"{name:<22} {len(data) / 1024:>9.0f} {backend:>7} {decode * 1000:>9.2f} {encode * 1000:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
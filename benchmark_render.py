@@ -0,0 +1,78 @@
+import argparse
+import random
+import time
+
+from sync import convert_notion_to_markdown
+
+
+def make_rich_text(text):
+    """构造与Notion API结构一致的富文本数组"""
+    return [{'type': 'text', 'plain_text': part, 'text': {'content': part}} for part in text.split(' ')]
+
+
+def make_block(block_type, text, **extra):
+    """构造单个Notion块"""
+    return {
+        'object': 'block',
+        'type': block_type,
+        'has_children': False,
+        block_type: {'rich_text': make_rich_text(text), **extra}
+    }
+
+
+def generate_blocks(count, nested=False, seed=0):
+    """生成指定数量的混合类型块，nested=True 时列表项带一层子块"""
+    rng = random.Random(seed)
+    words = ['notion', 'github', 'sync', '同步', '笔记', 'markdown', 'block', 'page', '数据库', 'render']
+    blocks = []
+    while len(blocks) < count:
+        text = ' '.join(rng.choice(words) for _ in range(rng.randint(5, 30)))
+        kind = rng.random()
+        if kind < 0.5:
+            block = make_block('paragraph', text)
+        elif kind < 0.6:
+            block = make_block(f'heading_{rng.randint(1, 3)}', text)
+        elif kind < 0.8:
+            block = make_block(rng.choice(['bulleted_list_item', 'numbered_list_item']), text)
+            if nested:
+                block['has_children'] = True
+                block['children'] = [make_block('bulleted_list_item', text)]
+        elif kind < 0.9:
+            block = make_block('code', text.replace(' ', '\n'), language='python', caption=[])
+        else:
+            block = make_block('quote', text)
+        blocks.append(block)
+    return blocks
+
+
+def benchmark(count, nested, repeat):
+    """渲染同一页面 repeat 次，返回最快一次的耗时和输出大小"""
+    page = {'id': 'benchmark', 'created_time': '2024-01-01T00:00:00.000Z', 'last_edited_time': '2024-01-01T00:00:00.000Z',
+            'properties': {'Name': {'type': 'title', 'title': make_rich_text('Benchmark')}}}
+    content = {'results': generate_blocks(count, nested)}
+    best = None
+    size = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        markdown = convert_notion_to_markdown(page, content)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        size = len(markdown.encode('utf-8'))
+    return best, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Markdown渲染吞吐量基准测试')
+    parser.add_argument('--sizes', default='1000,10000,50000', help='每页块数，用逗号分隔')
+    parser.add_argument('--repeat', type=int, default=5, help='每种规模重复次数（取最快一次）')
+    parser.add_argument('--nested', action='store_true', help='列表项带嵌套子块')
+    args = parser.parse_args()
+
+    print(f"{'块数':>8} {'耗时(ms)':>10} {'块/秒':>12} {'MB/秒':>8}")
+    for count in (int(size) for size in args.sizes.split(',')):
+        elapsed, size = benchmark(count, args.nested, args.repeat)
+        print(f"{count:>8} {elapsed * 1000:>10.1f} {count / elapsed:>12,.0f} {size / elapsed / 1e6:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,13 +2,29 @@ import requests
 import json
 import os
 import base64
+import difflib
+import gzip
 import hashlib
-from datetime import datetime, timedelta
+import multiprocessing
+import posixpath
+import re
+import shutil
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone
+from urllib.parse import quote, urlparse
 from dotenv import load_dotenv
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 import threading
-from functools import lru_cache
 import time
+from collections import OrderedDict
+from collections.abc import Mapping
+from functools import lru_cache
+
+try:
+    import orjson  # 可选：更快的JSON编解码
+except ImportError:
+    orjson = None
 
 # 加载环境变量
 load_dotenv()
@@ -16,6 +32,7 @@ load_dotenv()
 # 全局会话对象，用于连接复用
 notion_session = requests.Session()
 github_session = requests.Session()
+asset_session = requests.Session()  # 下载附件（签名URL，不能带Notion的认证头）
 
 # 线程锁
 print_lock = threading.Lock()
@@ -25,6 +42,47 @@ def safe_print(*args, **kwargs):
     with print_lock:
         print(*args, **kwargs)
 
+# JSON编解码后端：auto 在安装了 orjson 时使用它，json 强制使用标准库
+JSON_BACKEND = os.getenv('JSON_BACKEND', 'auto').lower()
+use_orjson = orjson is not None and JSON_BACKEND != 'json'
+
+
+def json_loads(data):
+    """解析JSON文本（str 或 UTF-8 bytes）"""
+    if use_orjson:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_dumps(obj, indent=False):
+    """序列化为UTF-8字节，非ASCII字符原样保留；indent=True 时缩进两格，否则紧凑输出"""
+    if use_orjson:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    if indent:
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode('utf-8')
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def response_json(response):
+    """解析API响应体"""
+    try:
+        return json_loads(response.content)
+    except ValueError:
+        # 交给requests抛出它自己的JSONDecodeError（属于RequestException，调用方已处理）
+        return response.json()
+
+
+def read_json_file(path):
+    """读取JSON文件"""
+    with open(path, 'rb') as f:
+        return json_loads(f.read())
+
+
+def write_json_file(path, obj, indent=False):
+    """写入JSON文件"""
+    with open(path, 'wb') as f:
+        f.write(json_dumps(obj, indent))
+
 NOTION_API_KEY = os.getenv('NOTION_API_KEY')
 # 支持多个数据库ID（优先使用NOTION_DATABASE_IDS）
 NOTION_DATABASE_IDS = os.getenv('NOTION_DATABASE_IDS')
@@ -39,12 +97,77 @@ SYNC_MODE = os.getenv('SYNC_MODE', 'all')  # 'databases', 'pages', 'all'
 BATCH_COMMIT = os.getenv('BATCH_COMMIT', 'true').lower() == 'true'  # 是否批量提交
 SKIP_COMMIT = os.getenv('SKIP_COMMIT', 'false').lower() == 'true'  # 是否跳过提交
 
+# 子页面爬取配置
+CRAWL_CHILD_PAGES = os.getenv('CRAWL_CHILD_PAGES', 'false').lower() == 'true'  # 是否沿子页面块爬取页面树
+CRAWL_ROOT_PAGE_IDS = os.getenv('CRAWL_ROOT_PAGE_IDS', '').strip()  # 爬取的根页面ID（逗号分隔），为空时从搜索结果中找根页面
+# 爬取时需要展开查找子页面的容器块（子页面常放在分栏和折叠块中）
+CRAWL_CONTAINER_BLOCK_TYPES = {'column_list', 'column', 'toggle'}
+
 # 文件夹分类配置
 CATEGORY_PROPERTIES = os.getenv('CATEGORY_PROPERTIES', 'Status,Category,Type,状态,分类,类型,Stage,阶段').split(',')
 ENABLE_CATEGORIZATION = os.getenv('ENABLE_CATEGORIZATION', 'true').lower() == 'true'  # 是否启用分类
 
+# 属性投影配置
+ENABLE_PROPERTY_PROJECTION = os.getenv('ENABLE_PROPERTY_PROJECTION', 'true').lower() == 'true'  # 数据库查询是否只请求用到的属性
+
+# 大数据库分段查询配置：按创建时间拆成多个区间并发分页（1表示不拆分）
+DATABASE_QUERY_PARTITIONS = int(os.getenv('DATABASE_QUERY_PARTITIONS', '1'))
+
 # 数据库表格显示配置
 DATABASE_TABLE_PROPERTIES = os.getenv('DATABASE_TABLE_PROPERTIES', '').strip()  # 用户自定义表格属性
+DATABASE_TABLE_SPLIT_ROWS = int(os.getenv('DATABASE_TABLE_SPLIT_ROWS', '0'))  # 嵌入表格超过该行数时拆分为编号文件，0表示不拆分
+
+# 自适应并发配置
+NOTION_MAX_CONCURRENCY = int(os.getenv('NOTION_MAX_CONCURRENCY', '16'))  # Notion API最大并发
+GITHUB_MAX_CONCURRENCY = int(os.getenv('GITHUB_MAX_CONCURRENCY', '20'))  # GitHub API最大并发
+TARGET_LATENCY = float(os.getenv('TARGET_LATENCY', '2.0'))  # 健康请求的目标延迟（秒）
+REQUEST_TIMEOUT = float(os.getenv('REQUEST_TIMEOUT', '30'))  # 单次请求超时（秒）
+MAX_RETRIES = int(os.getenv('MAX_RETRIES', '3'))  # 限流/超时/5xx的最大重试次数
+
+# 附件镜像配置：图片、文件和PDF块下载到仓库，避免Notion托管链接一小时后过期
+MIRROR_ASSETS = os.getenv('MIRROR_ASSETS', 'true').lower() == 'true'  # 是否镜像附件
+ASSET_FOLDER = os.getenv('ASSET_FOLDER', '_assets')  # 附件在 GITHUB_PATH 下的文件夹
+ASSET_DOWNLOAD_CONCURRENCY = int(os.getenv('ASSET_DOWNLOAD_CONCURRENCY', '4'))  # 附件下载最大并发
+ASSET_MAX_SIZE_MB = float(os.getenv('ASSET_MAX_SIZE_MB', '50'))  # 超过该大小的附件不镜像
+
+# Notion请求缓存配置
+NOTION_CACHE_TTL = float(os.getenv('NOTION_CACHE_TTL', '300'))  # 成功响应的缓存时间（秒），0表示只合并并发请求
+NOTION_CACHE_SIZE = int(os.getenv('NOTION_CACHE_SIZE', '512'))  # 最多缓存的响应数（LRU淘汰）
+
+# 时间预算配置（CI任务有硬超时时使用）
+SYNC_DEADLINE = float(os.getenv('SYNC_DEADLINE', '0'))  # 同步时间预算（秒），0表示不限制
+SYNC_DEADLINE_RESERVE = float(os.getenv('SYNC_DEADLINE_RESERVE', '0')) or max(30.0, SYNC_DEADLINE * 0.1)  # 为提交预留的时间
+
+# 本次运行停止发起新获取的时间点
+run_deadline = None
+
+# 常驻模式配置
+SYNC_DAEMON = os.getenv('SYNC_DAEMON', 'false').lower() == 'true'  # 是否以常驻模式运行
+DAEMON_MIN_INTERVAL = float(os.getenv('DAEMON_MIN_INTERVAL', '5'))  # 有活动时的最短轮询间隔（秒）
+DAEMON_MAX_INTERVAL = float(os.getenv('DAEMON_MAX_INTERVAL', '300'))  # 空闲时的最长轮询间隔（秒）
+
+# 分片配置（多个进程或CI任务并行同步）
+SYNC_SHARD = os.getenv('SYNC_SHARD', '').strip()  # 当前分片，格式 "i/N"，如 "0/4"
+SHARD_MANIFEST_DIR = os.getenv('SHARD_MANIFEST_DIR', 'shard_manifests')  # 分片tree清单目录
+SHARD_MERGE = os.getenv('SHARD_MERGE', 'false').lower() == 'true'  # 是否执行分片合并
+# 本次分片运行的标识，默认使用GitHub Actions的运行ID（同一次运行的matrix任务相同）
+SHARD_RUN_ID = os.getenv('SHARD_RUN_ID', os.getenv('GITHUB_RUN_ID', '')).strip()
+
+
+def parse_shard_spec(spec):
+    """解析 "i/N" 格式的分片配置，未配置时返回None"""
+    if not spec:
+        return None
+    try:
+        index, count = (int(part) for part in spec.split('/'))
+    except ValueError:
+        raise SystemExit(f"❌ SYNC_SHARD 格式错误: {spec}（应为 i/N，如 0/4）")
+    if count < 1 or not 0 <= index < count:
+        raise SystemExit(f"❌ SYNC_SHARD 超出范围: {spec}（要求 0 <= i < N）")
+    return index, count
+
+
+SHARD = parse_shard_spec(SYNC_SHARD)
 
 # 存储待提交的文件
 pending_files = []
@@ -52,6 +175,88 @@ pending_files = []
 # 文件位置映射表文件
 MAPPING_FILE = 'file_mapping.json'
 
+# 断点续传配置
+CHECKPOINT_FILE = os.getenv('SYNC_CHECKPOINT_FILE', '.sync_checkpoint.json')  # 检查点文件
+if CHECKPOINT_FILE and SHARD:
+    # 每个分片使用独立的检查点文件
+    CHECKPOINT_FILE = f"{CHECKPOINT_FILE}.shard-{SHARD[0]}-of-{SHARD[1]}"
+CHECKPOINT_INTERVAL = int(os.getenv('CHECKPOINT_INTERVAL', '20'))  # 每处理多少个页面保存一次检查点
+
+# 当前运行的检查点状态
+checkpoint_state = None
+
+# 块级缓存配置：未编辑的子块树直接复用上次渲染的Markdown，不再重新获取
+BLOCK_CACHE_FILE = os.getenv('BLOCK_CACHE_FILE', '.block_cache.json')  # 块缓存文件，为空时禁用
+if BLOCK_CACHE_FILE and SHARD:
+    BLOCK_CACHE_FILE = f"{BLOCK_CACHE_FILE}.shard-{SHARD[0]}-of-{SHARD[1]}"
+BLOCK_CACHE_MAX_AGE_DAYS = int(os.getenv('BLOCK_CACHE_MAX_AGE_DAYS', '30'))  # 多少天未见到的块从缓存中清除
+BLOCK_CACHE_VERSION = 4  # 块渲染规则变化时递增，使旧缓存失效
+
+# 块ID -> {'edited': 最后编辑时间, 'hash': 子树哈希, 'markdown': 子块Markdown, 'seen': 最后见到的日期}
+block_cache = None
+block_cache_lock = threading.Lock()
+block_cache_stats = {'reused': 0, 'fetched': 0, 'pages_reused': 0}
+
+# 附件索引：块ID -> {'size': 字节数, 'path': 仓库内路径, 'seen': 最后见到的日期}，提交成功后才保存
+ASSET_CACHE_FILE = os.getenv('ASSET_CACHE_FILE', '.asset_cache.json')
+if ASSET_CACHE_FILE and SHARD:
+    ASSET_CACHE_FILE = f"{ASSET_CACHE_FILE}.shard-{SHARD[0]}-of-{SHARD[1]}"
+asset_index = None
+asset_lock = threading.Lock()
+asset_executor = None
+asset_stats = {'downloaded': 0, 'reused': 0}
+
+# 本次新下载、待提交的附件（路径 -> 文件信息）
+pending_asset_files = {}
+
+# 本轮运行的同步块：原始块ID -> 子块树（各处副本共用，只获取一次）
+synced_block_sources = {}
+synced_block_locks = {}
+synced_block_stats = {'sources': 0, 'reused': 0}
+
+# 原始数据归档配置：保存页面、块和数据库的原始JSON，供 --rerender 离线重新渲染
+NOTION_ARCHIVE_DIR = os.getenv('NOTION_ARCHIVE_DIR', '').strip()  # 归档目录，为空时不归档
+RERENDER_OUTPUT_DIR = os.getenv('RERENDER_OUTPUT_DIR', '').strip()  # 重新渲染结果另存到的本地目录
+
+# 离线重新渲染时禁止访问Notion API
+offline_mode = False
+
+# 待提交内容的磁盘暂存目录（为空时使用临时目录，运行结束后删除）
+SPOOL_DIR = os.getenv('SYNC_SPOOL_DIR', '').strip()
+spool_dir = None
+spool_lock = threading.Lock()
+
+# 渲染进程池配置（0表示在线程中直接渲染）
+RENDER_PROCESSES = int(os.getenv('RENDER_PROCESSES', '0'))  # 渲染子进程数
+RENDER_BATCH_SIZE = int(os.getenv('RENDER_BATCH_SIZE', '16'))  # 每批发送给子进程的页面数
+
+# 当前运行的渲染进程池
+render_batcher = None
+
+# 本次运行的数据库缓存：结构信息、行数据和渲染好的嵌入表格
+database_info_cache = {}
+database_rows_cache = {}  # 数据库ID -> (行列表, 已请求的属性名集合，None表示全部属性)
+database_table_cache = {}  # (数据库ID, 行指纹) -> Markdown表格
+database_cache_lock = threading.Lock()
+database_fetch_locks = {}
+routing_plans = {}  # 数据库ID（独立页面和没有结构信息的数据库为None） -> RoutingPlan
+
+# 本次运行的输出路径索引：路径 -> 使用该路径的页面ID（含映射表中本次未处理的页面）
+output_path_owners = {}
+
+# 嵌入表格拆分出的编号文件，处理完页面后统一加入提交（路径 -> 文件信息）
+pending_table_files = {}
+# 表格行数减少后多出来的旧编号文件，随下一次提交一起删除（路径集合）
+pending_deletions = set()
+# 离线重新渲染时各表格文件夹本次的编号文件数，与仓库tree对比后得出多余的文件
+rendered_table_parts = {}
+
+# 页面ID -> 输出文件路径，用于把页面链接和提及渲染为相对链接
+link_index = {}
+# 渲染正文时先写入与位置无关的占位链接，写入暂存区前再换成相对路径（缓存的正文因此可以跨位置复用）
+PAGE_LINK_PATTERN = re.compile(r'notion-page://(label|path)/([0-9a-f]{32})')
+ASSET_LINK_PATTERN = re.compile(r'notion-asset://([^)\s]+)')
+
 # 设置会话Headers
 def setup_sessions():
     """设置全局会话的默认headers"""
@@ -66,49 +271,347 @@ def setup_sessions():
         'Accept': 'application/vnd.github.v3+json'
     })
 
-# 缓存装饰器
-@lru_cache(maxsize=1000)
-def cached_get_page_info(page_id):
-    """缓存的页面信息获取"""
-    return get_page_info_direct(page_id)
+class AdaptiveLimiter:
+    """AIMD自适应并发控制器
+
+    请求延迟和错误率正常时每轮加1个并发（加性增），
+    遇到429限流、超时或连续5xx时并发减半（乘性减）。
+    """
+
+    def __init__(self, name, initial, maximum, minimum=1, target_latency=TARGET_LATENCY):
+        self.name = name
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.target_latency = target_latency
+        self.in_flight = 0
+        self.condition = threading.Condition()
+        self.last_decrease = 0.0
+        self.recent_errors = []  # 最近请求是否出错的滑动窗口
+        self.stats = {
+            'requests': 0,
+            'throttled': 0,
+            'timeouts': 0,
+            'errors': 0,
+            'total_latency': 0.0,
+            'peak_limit': int(self.limit),
+            'peak_in_flight': 0
+        }
+
+    def acquire(self):
+        """等待直到当前并发低于限制"""
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+            self.stats['peak_in_flight'] = max(self.stats['peak_in_flight'], self.in_flight)
+
+    def release(self, latency, outcome):
+        """释放并发槽位，并根据请求结果调整并发限制"""
+        with self.condition:
+            saturated = self.in_flight * 2 >= self.limit
+            self.in_flight -= 1
+            self.stats['requests'] += 1
+            self.stats['total_latency'] += latency
+
+            is_error = outcome != 'ok'
+            self.recent_errors.append(is_error)
+            if len(self.recent_errors) > 20:
+                self.recent_errors.pop(0)
+
+            started_at = time.time() - latency
+            if outcome in ('throttled', 'timeout'):
+                self.stats['throttled' if outcome == 'throttled' else 'timeouts'] += 1
+                self._decrease(started_at)
+            elif outcome == 'error':
+                self.stats['errors'] += 1
+                # 错误率超过20%时视为过载
+                if sum(self.recent_errors) * 5 > len(self.recent_errors):
+                    self._decrease(started_at)
+            elif saturated and latency <= self.target_latency:
+                # 加性增：并发被充分使用时，每完成约limit个健康请求，并发加1
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+                self.stats['peak_limit'] = max(self.stats['peak_limit'], int(self.limit))
+
+            self.condition.notify_all()
+
+    def _decrease(self, started_at):
+        """乘性减；在上次减半之前就已发出的请求不再重复减半"""
+        if started_at < self.last_decrease:
+            return
+        self.last_decrease = time.time()
+        self.limit = max(self.minimum, self.limit / 2)
+
+    def summary(self):
+        """返回用于输出的指标"""
+        with self.condition:
+            requests_count = self.stats['requests']
+            avg_latency = self.stats['total_latency'] / requests_count if requests_count else 0.0
+            return {
+                'name': self.name,
+                'limit': int(self.limit),
+                'maximum': self.maximum,
+                'peak_limit': self.stats['peak_limit'],
+                'peak_in_flight': self.stats['peak_in_flight'],
+                'requests': requests_count,
+                'throttled': self.stats['throttled'],
+                'timeouts': self.stats['timeouts'],
+                'errors': self.stats['errors'],
+                'avg_latency': avg_latency
+            }
+
+
+notion_limiter = AdaptiveLimiter('Notion', initial=4, maximum=NOTION_MAX_CONCURRENCY)
+github_limiter = AdaptiveLimiter('GitHub', initial=8, maximum=GITHUB_MAX_CONCURRENCY)
+# 附件下载耗时取决于文件大小，以请求超时作为目标延迟
+asset_limiter = AdaptiveLimiter('Assets', initial=ASSET_DOWNLOAD_CONCURRENCY, maximum=ASSET_DOWNLOAD_CONCURRENCY,
+                                target_latency=REQUEST_TIMEOUT)
+
+
+class SingleFlightCache:
+    """合并并发的相同请求（single-flight），并在TTL内缓存成功的响应（LRU淘汰）
+
+    同一个键同时只有一个请求在途，其余调用等待并共享它的响应；
+    失败或非200的响应不缓存，下一次调用会重新请求。
+    """
+
+    def __init__(self, name, ttl, max_entries):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # 键 -> (过期时间, 响应)
+        self.in_flight = {}  # 键 -> Future
+        self.stats = {'hits': 0, 'misses': 0, 'shared': 0, 'evictions': 0}
+
+    def fetch(self, key, loader, cacheable=True):
+        """返回键对应的响应：命中缓存直接返回，已有相同请求在途则等待它，否则调用 loader
+
+        cacheable 为False时只合并并发请求，响应不进入缓存。
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self.entries.move_to_end(key)
+                    self.stats['hits'] += 1
+                    return entry[1]
+                del self.entries[key]
+
+            future = self.in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self.in_flight[key] = future
+                self.stats['misses'] += 1
+            else:
+                self.stats['shared'] += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            response = loader()
+        except BaseException as e:
+            with self.lock:
+                self.in_flight.pop(key, None)
+            future.set_exception(e)
+            raise
+
+        with self.lock:
+            self.in_flight.pop(key, None)
+            if cacheable and self.ttl > 0 and response.status_code == 200:
+                self.entries[key] = (time.monotonic() + self.ttl, response)
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+                    self.stats['evictions'] += 1
+        future.set_result(response)
+        return response
+
+    def clear(self):
+        """清空已缓存的响应（在途请求不受影响）"""
+        with self.lock:
+            self.entries.clear()
+
+    def summary(self):
+        """返回缓存指标"""
+        with self.lock:
+            lookups = self.stats['hits'] + self.stats['misses'] + self.stats['shared']
+            return dict(self.stats, name=self.name, size=len(self.entries),
+                        hit_rate=(self.stats['hits'] + self.stats['shared']) / lookups if lookups else 0.0)
+
+
+notion_cache = SingleFlightCache('Notion', ttl=NOTION_CACHE_TTL, max_entries=NOTION_CACHE_SIZE)
+
+
+def get_retry_delay(response, attempt):
+    """计算重试等待时间，优先使用服务端返回的Retry-After"""
+    if response is not None:
+        retry_after = response.headers.get('Retry-After')
+        if retry_after:
+            try:
+                return min(float(retry_after), 60.0)
+            except ValueError:
+                pass
+    return min(2 ** attempt, 30)
+
+
+def is_throttled_response(response):
+    """判断是否为限流响应（Notion返回429，GitHub还可能返回403且剩余额度为0）"""
+    if response.status_code == 429:
+        return True
+    return response.status_code == 403 and (
+        response.headers.get('X-RateLimit-Remaining') == '0' or 'Retry-After' in response.headers
+    )
+
+
+def api_request(session, limiter, method, url, **kwargs):
+    """经过自适应并发控制发送请求，限流/超时/5xx时退避重试"""
+    kwargs.setdefault('timeout', REQUEST_TIMEOUT)
+    response = None
+
+    for attempt in range(MAX_RETRIES + 1):
+        limiter.acquire()
+        start = time.time()
+        try:
+            response = session.request(method, url, **kwargs)
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+            limiter.release(time.time() - start, 'timeout')
+            if attempt == MAX_RETRIES:
+                raise
+            time.sleep(get_retry_delay(None, attempt))
+            continue
+
+        latency = time.time() - start
+        if is_throttled_response(response):
+            limiter.release(latency, 'throttled')
+        elif response.status_code >= 500:
+            limiter.release(latency, 'error')
+        else:
+            limiter.release(latency, 'ok')
+            return response
+
+        if attempt < MAX_RETRIES:
+            time.sleep(get_retry_delay(response, attempt))
+
+    return response
+
+
+def notion_request(method, url, **kwargs):
+    """发送Notion API请求（只读请求，按 方法+URL+参数+请求体 合并并发请求）
+
+    只缓存GET请求（页面、数据库、块和子块列表，爬取页面树时列出的子块随后处理页面时直接复用）；
+    搜索和数据库查询是按游标分页的POST请求，每一页只会读取一次，缓存它们只会占用内存。
+    """
+    if offline_mode:
+        raise requests.exceptions.ConnectionError(f"离线重新渲染模式不访问Notion API: {url}")
+    key = (
+        method,
+        url,
+        json.dumps(kwargs.get('params'), sort_keys=True),
+        json.dumps(kwargs.get('json'), sort_keys=True)
+    )
+    return notion_cache.fetch(key, lambda: api_request(notion_session, notion_limiter, method, url, **kwargs),
+                              cacheable=method == 'GET')
+
+
+def github_request(method, url, **kwargs):
+    """发送GitHub API请求"""
+    return api_request(github_session, github_limiter, method, url, **kwargs)
+
+
+def print_concurrency_metrics():
+    """输出自适应并发控制器的指标"""
+    safe_print(f"\n📈 并发控制指标:")
+    for limiter in (notion_limiter, github_limiter, asset_limiter):
+        m = limiter.summary()
+        if limiter is asset_limiter and not m['requests']:
+            continue
+        safe_print(f"   {m['name']}: 当前并发上限 {m['limit']}/{m['maximum']}，"
+                   f"峰值上限 {m['peak_limit']}，峰值在途 {m['peak_in_flight']}")
+        safe_print(f"      请求 {m['requests']} 次，限流 {m['throttled']} 次，超时 {m['timeouts']} 次，"
+                   f"5xx {m['errors']} 次，平均延迟 {m['avg_latency']:.2f} 秒")
+    m = notion_cache.summary()
+    safe_print(f"   {m['name']}缓存: 命中 {m['hits']} 次，未命中 {m['misses']} 次，合并并发请求 {m['shared']} 次，"
+               f"淘汰 {m['evictions']} 次，命中率 {m['hit_rate']:.0%}，当前 {m['size']} 项")
+
+
+def make_work_item(page_data, source, database_title=None, parent_title=None, folder_prefix=None, database_id=None):
+    """生成待处理的工作项：页面数据（紧凑记录） + 来源上下文"""
+    return {
+        'page': compact_page(page_data),
+        'source': source,  # 'database' 或 'standalone'
+        'database_title': database_title,
+        'parent_title': parent_title,
+        'folder_prefix': folder_prefix,  # 爬取到的子页面/子数据库：父页面所在的文件夹
+        'database_id': database_id  # 用于查找按数据库结构编译的分类计划
+    }
+
+
+def deadline_reached():
+    """判断时间预算是否即将用尽"""
+    return run_deadline is not None and time.time() >= run_deadline
+
+
+# 推迟列表中表示“跳过了独立页面的发现”的标记，其余条目是页面或数据库ID
+DEFERRED_STANDALONE_DISCOVERY = 'standalone-discovery'
 
-def get_page_info_direct(page_id):
-    """直接获取页面信息（不使用缓存）"""
-    url = f'https://api.notion.com/v1/pages/{page_id}'
-    try:
-        response = notion_session.get(url)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        safe_print(f"获取页面 {page_id} 信息时出错: {e}")
-        return None
 
-def process_page_parallel(page_data, database_title, parent_title, file_mapping):
+def get_carried_over_ids():
+    """上次运行因时间预算推迟的页面ID、跳过的数据库ID和独立页面发现标记"""
+    return set(checkpoint_state.get('deferred', [])) if checkpoint_state else set()
+
+
+def prioritize_work_items(work_items):
+    """时间预算模式下的处理顺序：上次推迟的页面优先，其余按最后编辑时间倒序"""
+    carried_over = get_carried_over_ids()
+    ordered = sorted(work_items, key=lambda item: item['page'].get('last_edited_time', ''), reverse=True)
+    ordered.sort(key=lambda item: item['page']['id'] not in carried_over)
+    return ordered
+
+
+def process_page_parallel(work_item, file_mapping):
     """并行处理单个页面"""
+    page_data = work_item['page']
     try:
         page_id = page_data['id']
+
+        # 检查点中已处理且未再编辑的页面直接跳过
+        resumed = get_resumed_page(page_data)
+        if resumed:
+            return {
+                'success': True,
+                'resumed': True,
+                'page_id': page_id,
+                'title': get_page_title(page_data) or f"页面_{page_id}",
+                'folder_path': resumed['folder_path'],
+                'filename': resumed['filename'],
+                'new_file_path': resumed['path']
+            }
+
+        # 时间预算用尽时不再发起新的获取，留到下次运行
+        if deadline_reached():
+            return {'success': False, 'deferred': True, 'page_id': page_id}
         
-        # 获取页面属性
-        page_properties = get_page_properties(page_data)
-        
-        # 生成文件名
-        title = get_page_title(page_data)
-        if not title:
-            title = f"页面_{page_id}"
-        
-        # 生成文件夹路径
-        folder_path = generate_folder_path(database_title, page_properties, parent_title)
-        
-        # 获取页面内容
-        content_data = get_page_content(page_id)
-        
-        # 转换为Markdown
-        source_info = f"数据库: {database_title}"
-        markdown_content = convert_notion_to_markdown(page_data, content_data, source_info)
+        # 生成文件名和文件夹路径
+        title, folder_path, filename, source_info = get_page_location(work_item)
+        archive_write('pages', page_id, work_item)
         
-        # 生成文件名
-        filename = clean_filename(title)
         new_file_path = f"{GITHUB_PATH}/{folder_path}/{filename}.md"
+
+        # 正文没变时（页面未编辑或只改了属性）直接用缓存的正文拼上新的页头
+        cached_body, content_data = get_page_body(page_data)
+        if cached_body is not None:
+            markdown = render_page_header(page_data, source_info) + cached_body
+            blob_sha, size = spool_content(resolve_page_links(markdown, new_file_path))
+        else:
+            # 需要网络请求的块（如嵌入数据库）在线程中预先渲染，其余部分是纯计算
+            resolved = resolve_render_dependencies(content_data)
+
+            # 转换为Markdown并写入磁盘暂存区，内存中只保留路径/哈希/大小
+            blob_sha, size, body = render_page_to_spool(page_data, content_data, source_info, resolved, new_file_path)
+            cache_page_body(page_data, content_data, body)
         
         # 检查是否需要删除旧位置的文件
         if page_id in file_mapping:
@@ -117,8 +620,9 @@ def process_page_parallel(page_data, database_title, parent_title, file_mapping)
                 safe_print(f"🔄 检测到文件位置变更: {page_id}")
                 safe_print(f"   旧位置: {old_file_path}")
                 safe_print(f"   新位置: {new_file_path}")
-                # 删除旧位置的文件
-                delete_github_file(old_file_path)
+                # 删除旧位置的文件（同名页面加后缀前共用的文件仍由其他页面使用时保留）
+                if output_path_owners.get(old_file_path, page_id) == page_id:
+                    delete_github_file(old_file_path)
         
         # 更新映射表
         file_mapping[page_id] = new_file_path
@@ -129,13 +633,150 @@ def process_page_parallel(page_data, database_title, parent_title, file_mapping)
             'title': title,
             'folder_path': folder_path,
             'filename': filename,
-            'content': markdown_content,
-            'new_file_path': new_file_path
+            'blob_sha': blob_sha,
+            'size': size,
+            'new_file_path': new_file_path,
+            'page_data': page_data
         }
     except Exception as e:
         safe_print(f"处理页面 {page_data.get('id', 'unknown')} 时出错: {e}")
         return {'success': False, 'error': str(e)}
 
+def get_page_location(work_item):
+    """根据页面来源和属性计算 (标题, 文件夹路径, 文件名, 来源说明)"""
+    page_data = work_item['page']
+    page_id = page_data['id']
+
+    # 获取页面属性
+    page_properties = get_page_properties(page_data)
+
+    title = get_page_title(page_data)
+    if work_item['source'] == 'standalone':
+        if not title:
+            title = f"页面_{page_id[:8]}"
+        # 使用页面标题作为基础文件夹，就像数据库标题一样
+        folder_path = generate_folder_path(title, page_properties)
+        # 文件名使用固定名称，因为文件夹已经是页面名称了
+        filename = "content"
+        source_info = f"独立页面: {title}"
+    else:
+        if not title:
+            title = f"页面_{page_id}"
+        folder_path = generate_folder_path(work_item['database_title'], page_properties, work_item['parent_title'],
+                                           get_routing_plan(work_item.get('database_id')))
+        filename = clean_filename(title)
+        source_info = f"数据库: {work_item['database_title']}"
+    if work_item.get('folder_prefix'):
+        folder_path = f"{work_item['folder_prefix']}/{folder_path}"
+    if work_item.get('path_suffix'):
+        # 与其他页面路径冲突时由 index_output_paths 分配的后缀
+        filename = f"{filename}_{work_item['path_suffix']}"
+    return title, folder_path, filename, source_info
+
+
+def index_output_paths(work_items, file_mapping):
+    """建立输出路径索引，同标题同分类的页面按页面ID加后缀区分，返回冲突的页面数
+
+    路径已在映射表中属于仍路由到这里的页面时由它继续使用（历史上重复的映射取ID最小的），
+    否则由最早创建的页面使用；其余页面的文件名加上页面ID前8位。结果与线程完成顺序无关，
+    重复的页面不再每次运行互相覆盖同一个文件。
+    """
+    global output_path_owners
+    claimants = {}  # 路径 -> 本次路由到该路径的工作项
+    for work_item in work_items:
+        work_item.pop('path_suffix', None)
+        claimants.setdefault(get_output_path(work_item), []).append(work_item)
+
+    run_ids = {work_item['page']['id'] for work_item in work_items}
+    mapped = {}  # 路径 -> 映射表中记录在该路径的页面ID
+    for page_id, file_path in file_mapping.items():
+        mapped.setdefault(file_path, []).append(page_id)
+
+    # 本次未处理的页面继续占用映射表中的路径
+    owners = {file_path: page_id for page_id, file_path in file_mapping.items() if page_id not in run_ids}
+    collisions = 0
+    for file_path, items in claimants.items():
+        item_ids = {item['page']['id'] for item in items}
+        candidates = [page_id for page_id in mapped.get(file_path, []) if page_id in item_ids or page_id not in run_ids]
+        if len(items) == 1 and len(candidates) <= 1 and (not candidates or candidates[0] in item_ids):
+            owners[file_path] = items[0]['page']['id']
+            continue
+        if candidates:
+            owner = min(candidates)
+        else:
+            owner = min(items, key=lambda item: (item['page'].get('created_time', ''), item['page']['id']))['page']['id']
+        owners[file_path] = owner
+        for item in items:
+            if item['page']['id'] != owner:
+                item['path_suffix'] = normalize_notion_id(item['page']['id'])[:8]
+                owners[file_path[:-len('.md')] + f"_{item['path_suffix']}.md"] = item['page']['id']
+                collisions += 1
+
+    output_path_owners = owners
+    if collisions:
+        safe_print(f"⚠️ {collisions} 个页面与同名页面的路径冲突，文件名已加上页面ID后缀")
+    return collisions
+
+
+def get_output_path(work_item):
+    """工作项的输出文件路径"""
+    _, folder_path, filename, _ = get_page_location(work_item)
+    return f"{GITHUB_PATH}/{folder_path}/{filename}.md"
+
+
+def build_link_index(work_items, file_mapping):
+    """建立 页面ID -> 输出路径 的索引：映射表中记录的位置加上本次运行的路由结果，渲染链接时无需请求API"""
+    index = {normalize_notion_id(page_id): file_path for page_id, file_path in file_mapping.items()}
+    for work_item in work_items:
+        index[normalize_notion_id(work_item['page']['id'])] = get_output_path(work_item)
+    return index
+
+
+def set_link_index(index):
+    """设置链接索引（渲染子进程启动时也调用一次）"""
+    global link_index
+    link_index = index
+
+
+def page_link(page_id, label=None):
+    """生成指向页面的占位链接，label为空时使用目标文件的名称"""
+    page_id = normalize_notion_id(page_id)
+    if label is None:
+        label = f"notion-page://label/{page_id}"
+    else:
+        label = label.replace('[', '\\[').replace(']', '\\]')
+    return f"[{label}](notion-page://path/{page_id})"
+
+
+def resolve_page_links(markdown, file_path):
+    """把占位链接换成相对于 file_path 的路径；不在工作区内的页面退化为Notion网页链接"""
+    if 'notion-' not in markdown:
+        return markdown
+    base = posixpath.dirname(file_path)
+    if 'notion-asset://' in markdown:
+        # 镜像的附件：占位中是仓库内路径
+        markdown = ASSET_LINK_PATTERN.sub(lambda match: quote(posixpath.relpath(match.group(1), base)), markdown)
+    if 'notion-page://' not in markdown:
+        return markdown
+
+    def replace(match):
+        kind, page_id = match.groups()
+        target = link_index.get(page_id)
+        if kind == 'label':
+            if not target:
+                return page_id
+            # 独立页面的文件名固定为content，用所在文件夹的名称
+            name = posixpath.splitext(posixpath.basename(target))[0]
+            if name == 'content':
+                name = posixpath.basename(posixpath.dirname(target))
+            return name.replace('[', '\\[').replace(']', '\\]')
+        if not target:
+            return f"https://www.notion.so/{page_id}"
+        return quote(posixpath.relpath(target, base))
+
+    return PAGE_LINK_PATTERN.sub(replace, markdown)
+
+
 def batch_check_github_files(file_paths):
     """批量检查GitHub文件是否存在和内容"""
     results = {}
@@ -143,13 +784,11 @@ def batch_check_github_files(file_paths):
     def check_single_file(file_path):
         try:
             url = f'https://api.github.com/repos/{GITHUB_OWNER}/{GITHUB_REPO}/contents/{file_path}'
-            response = github_session.get(url)
+            response = github_request('GET', url)
             if response.status_code == 200:
-                existing_data = response.json()
-                existing_content = base64.b64decode(existing_data['content']).decode('utf-8')
+                # 只保留blob SHA，内容比较通过SHA完成，不在内存中保留远端文件
                 return file_path, {
-                    'sha': existing_data['sha'],
-                    'content': existing_content,
+                    'sha': response_json(response)['sha'],
                     'exists': True
                 }
             else:
@@ -158,7 +797,8 @@ def batch_check_github_files(file_paths):
             return file_path, {'exists': False, 'error': str(e)}
     
     # 并行检查文件
-    with ThreadPoolExecutor(max_workers=10) as executor:
+    # 线程数取上限，实际并发由自适应控制器决定
+    with ThreadPoolExecutor(max_workers=github_limiter.maximum) as executor:
         future_to_path = {executor.submit(check_single_file, path): path for path in file_paths}
         for future in as_completed(future_to_path):
             file_path, result = future.result()
@@ -171,8 +811,7 @@ def load_file_mapping():
     """加载文件位置映射表"""
     try:
         if os.path.exists(MAPPING_FILE):
-            with open(MAPPING_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            return read_json_file(MAPPING_FILE)
         return {}
     except Exception as e:
         safe_print(f"⚠️ 加载文件映射表时出错: {e}")
@@ -182,26 +821,163 @@ def load_file_mapping():
 def save_file_mapping(mapping):
     """保存文件位置映射表"""
     try:
-        with open(MAPPING_FILE, 'w', encoding='utf-8') as f:
-            json.dump(mapping, f, ensure_ascii=False, indent=2)
+        write_json_file(MAPPING_FILE, mapping, indent=True)
     except Exception as e:
         safe_print(f"⚠️ 保存文件映射表时出错: {e}")
 
 
-def delete_github_file(file_path):
-    """删除GitHub上的文件"""
-    headers = {
-        'Authorization': f'token {GITHUB_TOKEN}',
-        'Accept': 'application/vnd.github.v3+json'
+def get_checkpoint_key():
+    """生成检查点的配置指纹，配置变化后旧检查点自动失效"""
+    key_source = '|'.join([
+        str(GITHUB_OWNER), str(GITHUB_REPO), str(GITHUB_PATH), SYNC_MODE,
+        ','.join(get_database_ids()), ','.join(CATEGORY_PROPERTIES), str(ENABLE_CATEGORIZATION),
+        SYNC_SHARD
+    ])
+    return hashlib.md5(key_source.encode('utf-8')).hexdigest()
+
+
+def checkpoint_enabled():
+    """只有在会上传blob的批量提交模式下才启用检查点"""
+    return BATCH_COMMIT and not SKIP_COMMIT and bool(CHECKPOINT_FILE)
+
+
+def load_checkpoint():
+    """加载上次中断运行留下的检查点"""
+    empty_state = {
+        'key': get_checkpoint_key(),
+        'pages': {},
+        'pending': [],
+        'file_mapping': {},
+        'unsaved': 0
+    }
+    if not checkpoint_enabled() or not os.path.exists(CHECKPOINT_FILE):
+        return empty_state
+
+    try:
+        state = read_json_file(CHECKPOINT_FILE)
+    except Exception as e:
+        safe_print(f"⚠️ 加载检查点时出错，将重新开始: {e}")
+        return empty_state
+
+    if state.get('key') != empty_state['key']:
+        safe_print("⚠️ 检查点与当前配置不匹配，将重新开始")
+        return empty_state
+
+    state.setdefault('pages', {})
+    state.setdefault('pending', [])
+    state.setdefault('file_mapping', {})
+    state.setdefault('deferred', [])
+    state['unsaved'] = 0
+    return state
+
+
+def save_checkpoint(force=False, pending=None):
+    """保存检查点（先写临时文件再替换，避免中断时写坏）"""
+    if not checkpoint_enabled() or checkpoint_state is None:
+        return
+    if not force and checkpoint_state['unsaved'] < CHECKPOINT_INTERVAL:
+        return
+
+    if pending is None:
+        pending = pending_files
+
+    with print_lock:
+        data = {
+            'key': checkpoint_state['key'],
+            'updated_at': datetime.now().isoformat(),
+            'pages': dict(checkpoint_state['pages']),
+            'pending': [file_info for file_info in pending if file_info.get('uploaded')],
+            'file_mapping': dict(checkpoint_state['file_mapping']),
+            'deferred': list(checkpoint_state.get('deferred', []))
+        }
+        checkpoint_state['unsaved'] = 0
+
+    try:
+        tmp_file = f"{CHECKPOINT_FILE}.tmp"
+        write_json_file(tmp_file, data)
+        os.replace(tmp_file, CHECKPOINT_FILE)
+    except Exception as e:
+        safe_print(f"⚠️ 保存检查点时出错: {e}")
+
+
+def finish_checkpoint(deferred_ids):
+    """提交成功后更新检查点：全部完成则删除；有推迟的页面则保留进度，供下次运行继续"""
+    if not deferred_ids:
+        clear_checkpoint()
+        if checkpoint_state is not None:
+            # 常驻模式下进程继续运行：已提交的页面在同一分钟内再次编辑时不能当作已处理而跳过
+            checkpoint_state.update(pages={}, pending=[], file_mapping={}, unsaved=0)
+        return
+    if checkpoint_state is None:
+        return
+    checkpoint_state['deferred'] = list(deferred_ids)
+    save_checkpoint(force=True, pending=[])
+
+
+def clear_checkpoint():
+    """同步成功提交后删除检查点"""
+    try:
+        if CHECKPOINT_FILE and os.path.exists(CHECKPOINT_FILE):
+            os.remove(CHECKPOINT_FILE)
+    except Exception as e:
+        safe_print(f"⚠️ 删除检查点时出错: {e}")
+
+
+def get_resumed_page(page_data):
+    """如果页面在检查点中已处理且之后未被编辑，返回检查点记录"""
+    if checkpoint_state is None:
+        return None
+    record = checkpoint_state['pages'].get(page_data['id'])
+    if record and record.get('last_edited_time') == page_data.get('last_edited_time'):
+        return record
+    return None
+
+
+def discard_restored_file(file_path, page_id=None):
+    """页面在检查点之后又被编辑（或已删除）时，丢弃检查点中恢复的旧待提交文件
+
+    同一路径的文件被重新生成时丢弃；指定 page_id 时该页面的旧文件也一并丢弃，
+    页面移动到其他位置或已删除后，旧位置的文件不会再被提交。
+    """
+    global pending_files
+    restored_paths = checkpoint_state.get('restored_paths') if checkpoint_state is not None else None
+    if not restored_paths:
+        return
+    stale = {
+        f['path'] for f in pending_files
+        if f['path'] in restored_paths and (f['path'] == file_path or (page_id and f.get('page_id') == page_id))
     }
+    if not stale:
+        return
+    restored_paths.difference_update(stale)
+    pending_files = [f for f in pending_files if f['path'] not in stale]
+
+
+def record_page_checkpoint(page_data, folder_path, filename, file_path):
+    """记录已处理完成的页面，并按间隔保存检查点"""
+    if not checkpoint_enabled() or checkpoint_state is None:
+        return
+    page_id = page_data['id']
+    checkpoint_state['pages'][page_id] = {
+        'last_edited_time': page_data.get('last_edited_time'),
+        'folder_path': folder_path,
+        'filename': filename,
+        'path': file_path
+    }
+    checkpoint_state['file_mapping'][page_id] = file_path
+    checkpoint_state['unsaved'] += 1
+    save_checkpoint()
+
 
+def delete_github_file(file_path):
+    """删除GitHub上的文件"""
     url = f'https://api.github.com/repos/{GITHUB_OWNER}/{GITHUB_REPO}/contents/{file_path}'
 
     try:
         # 先获取文件信息以获取SHA
-        response = requests.get(url, headers=headers)
+        response = github_request('GET', url)
         if response.status_code == 200:
-            file_data = response.json()
+            file_data = response_json(response)
             sha = file_data['sha']
 
             # 删除文件
@@ -210,7 +986,7 @@ def delete_github_file(file_path):
                 'sha': sha
             }
 
-            delete_response = requests.delete(url, headers=headers, json=delete_data)
+            delete_response = github_request('DELETE', url, json=delete_data)
             if delete_response.status_code == 200:
                 safe_print(f"🗑️ 已删除旧文件: {file_path}")
                 return True
@@ -225,23 +1001,51 @@ def delete_github_file(file_path):
         return False
 
 
-def clean_deleted_pages(file_mapping):
-    """清理已删除页面对应的GitHub文件"""
+def clean_deleted_pages(file_mapping, seen_page_ids):
+    """清理已删除页面对应的GitHub文件
+
+    映射表中本次完整同步没有见到的页面逐个向Notion确认，已删除的页面文件加入待删除列表随提交删除。
+    返回 {页面ID: 文件路径}，由调用方在提交成功后从映射表中移除；提交失败时下次运行重新检查。
+    """
     if not file_mapping:
-        return
+        return {}
 
     safe_print(f"\n🧹 检查已删除的页面...")
-    
-    # 获取当前同步中处理过的页面ID
-    current_session_pages = set()
-    
-    # 从pending_files中提取页面ID（这需要我们存储页面ID信息）
-    # 由于当前结构限制，我们先跳过这个功能，在后续版本中改进
-    
-    # TODO: 在后续版本中添加更完善的清理机制
-    # 目前只清理位置变更的文件，已删除页面的清理将在后续版本中实现
-    
-    safe_print(f"✅ 清理检查完成")
+
+    seen = {normalize_notion_id(page_id) for page_id in seen_page_ids}
+    candidates = [page_id for page_id in file_mapping if normalize_notion_id(page_id) not in seen]
+    if not candidates:
+        safe_print(f"✅ 清理检查完成，没有已删除的页面")
+        return {}
+
+    # 没见到的页面可能只是移出了同步范围或发现时出错，只有Notion确认已删除的才清理
+    with ThreadPoolExecutor(max_workers=notion_limiter.maximum) as executor:
+        flags = list(executor.map(is_page_deleted, candidates))
+    deleted_pages = {page_id: file_mapping[page_id] for page_id, deleted in zip(candidates, flags) if deleted}
+
+    # 同名页面加后缀前共用的文件仍由其他页面使用时保留；仓库中不存在的文件不用删除
+    live_paths = {path for page_id, path in file_mapping.items() if page_id not in deleted_pages}
+    paths = sorted({path for path in deleted_pages.values() if path not in live_paths})
+    existing_files = batch_check_github_files(paths) if paths else {}
+    stale = [path for path in paths if existing_files.get(path, {}).get('exists')]
+    pending_deletions.update(stale)
+
+    for page_id, path in deleted_pages.items():
+        # 检查点中恢复的该页面的待提交文件不再提交
+        discard_restored_file(None, page_id)
+        safe_print(f"   🗑️ 页面已在Notion中删除: {path}")
+    safe_print(f"✅ 清理检查完成: {len(deleted_pages)} 个页面已删除，{len(stale)} 个文件将随提交删除")
+    return deleted_pages
+
+
+def forget_deleted_pages(file_mapping, deleted_pages):
+    """提交成功后把已删除的页面从映射表中移除并保存"""
+    if not deleted_pages:
+        return
+    for page_id in deleted_pages:
+        file_mapping.pop(page_id, None)
+    save_file_mapping(file_mapping)
+    safe_print(f"📋 映射表移除了 {len(deleted_pages)} 个已删除的页面")
 
 
 def get_database_ids():
@@ -257,46 +1061,58 @@ def get_database_ids():
         return []
 
 
-def search_all_pages():
-    """搜索所有页面（包括数据库中的页面和独立页面）"""
-    headers = {
-        'Authorization': f'Bearer {NOTION_API_KEY}',
-        'Content-Type': 'application/json',
-        'Notion-Version': '2022-06-28'
-    }
-
-    url = 'https://api.notion.com/v1/search'
-
-    all_pages = []
-    has_more = True
-    start_cursor = None
+# 分页预取线程池：拿到 next_cursor 后立即在后台请求下一页
+pagination_executor = None
+pagination_lock = threading.Lock()
 
-    while has_more:
-        data = {
-            'filter': {
-                'property': 'object',
-                'value': 'page'
-            },
-            'page_size': 100
-        }
 
-        if start_cursor:
-            data['start_cursor'] = start_cursor
+def get_pagination_executor():
+    """获取分页预取线程池（首次使用时创建）"""
+    global pagination_executor
+    with pagination_lock:
+        if pagination_executor is None:
+            pagination_executor = ThreadPoolExecutor(max_workers=max(2, notion_limiter.maximum),
+                                                     thread_name_prefix='notion-prefetch')
+        return pagination_executor
 
-        try:
-            response = requests.post(url, headers=headers, json=data)
-            response.raise_for_status()
-            result = response.json()
 
-            all_pages.extend(result.get('results', []))
-            has_more = result.get('has_more', False)
-            start_cursor = result.get('next_cursor')
+def iter_notion_pages(url, body=None, params=None, first_page=None):
+    """逐行产出Notion分页POST接口（搜索、数据库查询）的全部结果
 
-        except requests.exceptions.RequestException as e:
-            safe_print(f"搜索页面时出错: {e}")
-            break
+    每页返回后立即提交下一个游标的请求，调用方处理当前页的同时下一页已在途中；
+    调用方提前停止迭代时取消尚未开始的预取请求。已用相同请求体取得第一页时通过 first_page 传入，接着它的游标翻页。
+    """
+    def fetch_page(cursor):
+        payload = dict(body or {}, page_size=100)
+        if cursor:
+            payload['start_cursor'] = cursor
+        response = notion_request('POST', url, json=payload, params=params)
+        response.raise_for_status()
+        return response_json(response)
 
-    return all_pages
+    data = first_page if first_page is not None else fetch_page(None)
+    while True:
+        next_page = None
+        if data.get('has_more') and data.get('next_cursor'):
+            next_page = get_pagination_executor().submit(fetch_page, data['next_cursor'])
+        try:
+            yield from data.get('results', [])
+        except GeneratorExit:
+            if next_page:
+                next_page.cancel()
+            raise
+        if next_page is None:
+            return
+        data = next_page.result()
+
+
+def iter_search_pages():
+    """逐个产出搜索到的所有页面（包括数据库中的页面和独立页面），出错时在已获取的结果处停止"""
+    url = 'https://api.notion.com/v1/search'
+    try:
+        yield from iter_notion_pages(url, {'filter': {'property': 'object', 'value': 'page'}})
+    except requests.exceptions.RequestException as e:
+        safe_print(f"搜索页面时出错: {e}")
 
 
 def get_page_info(page_id):
@@ -304,22 +1120,57 @@ def get_page_info(page_id):
     url = f'https://api.notion.com/v1/pages/{page_id}'
 
     try:
-        response = notion_session.get(url)
+        response = notion_request('GET', url)
         response.raise_for_status()
-        return response.json()
+        return response_json(response)
     except requests.exceptions.RequestException as e:
         safe_print(f"获取页面 {page_id} 信息时出错: {e}")
         return None
 
 
+def is_page_deleted(page_id):
+    """页面是否已在Notion中删除（不存在、已归档或在回收站中）；请求出错时按未删除处理"""
+    url = f'https://api.notion.com/v1/pages/{page_id}'
+
+    try:
+        response = notion_request('GET', url)
+        if response.status_code == 404:
+            return True
+        response.raise_for_status()
+        page = response_json(response)
+        return bool(page.get('archived') or page.get('in_trash'))
+    except (requests.exceptions.RequestException, ValueError) as e:
+        safe_print(f"⚠️ 无法确认页面 {page_id} 是否已删除: {e}")
+        return False
+
+
+def get_database_fetch_lock(key):
+    """获取某个数据库缓存项的加锁对象，保证并发渲染时同一数据库只请求一次"""
+    with database_cache_lock:
+        return database_fetch_locks.setdefault(key, threading.Lock())
+
+
 def get_database_info(database_id):
+    """获取数据库信息，本次运行内每个数据库只请求一次"""
+    cache_key = normalize_notion_id(database_id)
+    with get_database_fetch_lock(('info', cache_key)):
+        if cache_key in database_info_cache:
+            return database_info_cache[cache_key]
+        db_info = fetch_database_info(database_id)
+        # 请求失败的结果不缓存，后续使用时再重试
+        if db_info.get('data'):
+            database_info_cache[cache_key] = db_info
+        return db_info
+
+
+def fetch_database_info(database_id):
     """获取数据库信息（包括名称和父页面关系）"""
     url = f'https://api.notion.com/v1/databases/{database_id}'
 
     try:
-        response = notion_session.get(url)
+        response = notion_request('GET', url)
         response.raise_for_status()
-        db_data = response.json()
+        db_data = response_json(response)
 
         # 获取数据库标题
         db_title = "未命名数据库"
@@ -337,12 +1188,14 @@ def get_database_info(database_id):
                 if parent_page_data:
                     parent_title = get_page_title(parent_page_data)
 
-        return {
+        db_info = {
             'id': database_id,
             'title': db_title,
             'parent_title': parent_title,
             'data': db_data
         }
+        archive_write('databases', database_id, db_info)
+        return db_info
     except requests.exceptions.RequestException as e:
         safe_print(f"获取数据库 {database_id} 信息时出错: {e}")
         return {
@@ -457,275 +1310,1258 @@ def generate_date_category(date_value):
     return None
 
 
-def fetch_notion_notes(database_id):
-    """获取指定Notion数据库中的笔记"""
+def iter_database_query(database_id, body=None, filter_properties=None):
+    """分页查询数据库，跨越所有游标逐行产出（预取下一页）；filter_properties 为只需返回的属性ID列表"""
     url = f'https://api.notion.com/v1/databases/{database_id}/query'
+    params = [('filter_properties', prop_id) for prop_id in filter_properties] if filter_properties else None
+    return iter_notion_pages(url, body, params)
+
 
+def fetch_notion_notes(database_id, filter_properties=None):
+    """获取指定Notion数据库中的全部笔记"""
     try:
-        response = notion_session.post(url)
-        response.raise_for_status()
-        return response.json()
+        if DATABASE_QUERY_PARTITIONS > 1:
+            return {'results': query_database_partitioned(database_id, filter_properties)}
+        return {'results': list(iter_database_query(database_id, filter_properties=filter_properties))}
     except requests.exceptions.RequestException as e:
         safe_print(f"获取数据库 {database_id} 的笔记时出错: {e}")
         return None
 
 
-def get_page_content(page_id):
-    """获取页面的具体内容"""
-    url = f'https://api.notion.com/v1/blocks/{page_id}/children'
+def query_database_partitioned(database_id, filter_properties=None):
+    """按创建时间把数据库查询拆成多个区间并发分页，合并时按页面ID去重
 
-    try:
-        response = notion_session.get(url)
+    游标只能串行翻页，大数据库会有上百次往返。先按创建时间升序取第一页：没有更多数据时直接返回；
+    否则再取最新的一行，把最早和最晚的创建时间之间等分为 DATABASE_QUERY_PARTITIONS 个区间。
+    第一个区间接着第一页的游标继续翻页，不重复获取已取得的行。
+    """
+    url = f'https://api.notion.com/v1/databases/{database_id}/query'
+    params = [('filter_properties', prop_id) for prop_id in filter_properties] if filter_properties else None
+    ascending = {'sorts': [{'timestamp': 'created_time', 'direction': 'ascending'}]}
+
+    def sample(direction, page_size):
+        body = {'sorts': [{'timestamp': 'created_time', 'direction': direction}], 'page_size': page_size}
+        response = notion_request('POST', url, json=body, params=params)
         response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        safe_print(f"获取页面内容时出错: {e}")
+        return response_json(response)
+
+    first_page = sample('ascending', 100)
+    if not first_page.get('has_more'):
+        return first_page.get('results', [])
+    newest = sample('descending', 1).get('results', [])
+    oldest_time = parse_notion_timestamp(first_page['results'][0].get('created_time'))
+    newest_time = parse_notion_timestamp(newest[0].get('created_time')) if newest else None
+    if oldest_time is None or newest_time is None:
+        return list(iter_notion_pages(url, ascending, params, first_page))
+
+    # 创建时间精确到分钟，区间边界取整到分钟，重复的边界合并
+    step = (newest_time - oldest_time) / DATABASE_QUERY_PARTITIONS
+    boundaries = []
+    for i in range(1, DATABASE_QUERY_PARTITIONS):
+        boundary = format_notion_timestamp(oldest_time + step * i)
+        if boundary > format_notion_timestamp(oldest_time) and boundary not in boundaries:
+            boundaries.append(boundary)
+    if not boundaries:
+        # 所有行在同一分钟内创建，无法拆分
+        return list(iter_notion_pages(url, ascending, params, first_page))
+
+    # 第一个区间（早于第一个边界）由第一页的游标继续翻页得到，其余区间按过滤条件并发查询
+    filters = [None]
+    for start, end in zip(boundaries, boundaries[1:]):
+        filters.append({'and': [
+            {'timestamp': 'created_time', 'created_time': {'on_or_after': start}},
+            {'timestamp': 'created_time', 'created_time': {'before': end}}
+        ]})
+    filters.append({'timestamp': 'created_time', 'created_time': {'on_or_after': boundaries[-1]}})
+    safe_print(f"   🔀 数据库 {database_id[:8]} 按创建时间分 {len(filters)} 段并发查询")
+
+    first_boundary = parse_notion_timestamp(boundaries[0])
+
+    def query_partition(partition_filter):
+        if partition_filter is not None:
+            return list(iter_database_query(database_id, {'filter': partition_filter}, filter_properties))
+        rows = []
+        for row in iter_notion_pages(url, ascending, params, first_page):
+            created = parse_notion_timestamp(row.get('created_time'))
+            if created is not None and created >= first_boundary:
+                # 按创建时间升序，之后的行都属于后面的区间
+                break
+            rows.append(row)
+        return rows
+
+    results = []
+    seen_ids = set()
+    with ThreadPoolExecutor(max_workers=len(filters)) as executor:
+        for rows in executor.map(query_partition, filters):
+            for row in rows:
+                # 查询期间新建或被编辑的行可能出现在两个区间中
+                if row['id'] not in seen_ids:
+                    seen_ids.add(row['id'])
+                    results.append(row)
+    return results
+
+
+def parse_notion_timestamp(timestamp):
+    """解析Notion的ISO时间戳，失败时返回None"""
+    try:
+        return datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
         return None
 
 
-def get_page_title(page_data):
-    """从页面数据中提取标题"""
-    if 'properties' in page_data:
-        for prop_name, prop_data in page_data['properties'].items():
-            if prop_data['type'] == 'title' and 'title' in prop_data:
-                if prop_data['title']:
-                    return prop_data['title'][0]['plain_text']
-                break
+def get_database_projection(database_id):
+    """计算数据库查询需要的属性：标题、分类属性，以及嵌入表格或自定义表格用到的列
 
-    # 如果没有找到title属性，尝试从其他地方获取
-    if 'title' in page_data and page_data['title']:
-        return page_data['title'][0]['plain_text'] if isinstance(page_data['title'], list) else str(page_data['title'])
+    返回 (属性ID列表, 属性名集合)，无法投影或不需要投影时返回 (None, None)
+    """
+    if not ENABLE_PROPERTY_PROJECTION or NOTION_ARCHIVE_DIR:
+        # 归档需要完整的原始数据，离线重新渲染时才能换用其他分类或表格配置
+        return None, None
+    db_info = get_database_info(database_id)
+    if not db_info.get('data'):
+        return None, None
 
-    return ""
+    properties = db_info['data'].get('properties', {})
+    names = get_row_property_names(properties, is_embedded_database(db_info['data']))
+    prop_ids = [properties[name].get('id') for name in names]
+    if len(names) >= len(properties) or not all(prop_ids):
+        return None, None
+    return prop_ids, names
 
 
-def get_page_properties(page_data):
-    """从页面数据中提取所有属性"""
-    properties = {}
-    if 'properties' in page_data:
-        for prop_name, prop_data in page_data['properties'].items():
-            prop_type = prop_data.get('type', '')
-            
-            if prop_type == 'select' and 'select' in prop_data and prop_data['select']:
-                properties[prop_name] = prop_data['select']['name']
-            elif prop_type == 'multi_select' and 'multi_select' in prop_data:
-                properties[prop_name] = [item['name'] for item in prop_data['multi_select']]
-            elif prop_type == 'status' and 'status' in prop_data and prop_data['status']:
-                properties[prop_name] = prop_data['status']['name']
-            elif prop_type == 'rich_text' and 'rich_text' in prop_data and prop_data['rich_text']:
-                properties[prop_name] = prop_data['rich_text'][0]['plain_text']
-            elif prop_type == 'number' and 'number' in prop_data and prop_data['number'] is not None:
-                properties[prop_name] = str(prop_data['number'])
-            elif prop_type == 'checkbox' and 'checkbox' in prop_data:
-                properties[prop_name] = '已完成' if prop_data['checkbox'] else '未完成'
-            elif prop_type == 'date' and 'date' in prop_data and prop_data['date']:
-                properties[prop_name] = prop_data['date']['start']
-            elif prop_type == 'url' and 'url' in prop_data and prop_data['url']:
-                properties[prop_name] = prop_data['url']
-            elif prop_type == 'title' and 'title' in prop_data and prop_data['title']:
-                properties[prop_name] = prop_data['title'][0]['plain_text']
-            elif prop_type == 'formula' and 'formula' in prop_data:
-                # 获取公式计算结果
-                formula_result = prop_data['formula']
-                if formula_result.get('type') == 'string' and formula_result.get('string'):
-                    properties[prop_name] = formula_result['string']
-                elif formula_result.get('type') == 'number' and formula_result.get('number') is not None:
-                    properties[prop_name] = str(formula_result['number'])
-                elif formula_result.get('type') == 'date' and formula_result.get('date'):
-                    properties[prop_name] = formula_result['date']['start']
-            elif prop_type == 'rollup' and 'rollup' in prop_data:
-                # 获取汇总结果
-                rollup_result = prop_data['rollup']
-                if rollup_result.get('type') == 'array' and rollup_result.get('array'):
-                    # 处理数组类型的汇总结果
-                    array_values = []
-                    for item in rollup_result['array']:
-                        if item.get('type') == 'rich_text' and item.get('rich_text'):
-                            array_values.append(item['rich_text'][0]['plain_text'])
-                    if array_values:
-                        properties[prop_name] = array_values
-                elif rollup_result.get('type') == 'number' and rollup_result.get('number') is not None:
-                    properties[prop_name] = str(rollup_result['number'])
-            elif prop_type == 'created_time':
-                properties[prop_name] = prop_data['created_time']
-            elif prop_type == 'last_edited_time':
-                properties[prop_name] = prop_data['last_edited_time']
-    
-    return properties
+def get_row_property_names(properties, embedded=False):
+    """数据库行需要保留的属性名：标题、分类属性和表格列
 
+    数据库嵌入在页面中（embedded）或配置了自定义表格列时包含表格用到的列，
+    嵌入表格直接复用发现阶段的行，同一数据库每轮只查询一次。
+    """
+    names = {name for name, prop in properties.items() if prop.get('type') == 'title'}
+    if ENABLE_CATEGORIZATION:
+        names.update(name.strip() for name in CATEGORY_PROPERTIES if name.strip() in properties)
+    if embedded or DATABASE_TABLE_PROPERTIES:
+        names.update(select_table_columns(properties)[1])
+    return names
 
-def generate_folder_path(database_title, page_properties, parent_title=None):
-    """根据数据库标题、父页面标题和页面属性生成文件夹路径"""
-    # 如果有父页面，使用父页面/数据库的结构
-    if parent_title:
-        base_folder = f"{clean_folder_name(parent_title)}/{clean_folder_name(database_title)}"
-    else:
-        base_folder = clean_folder_name(database_title)
-    
-    # 如果禁用分类，直接返回基础文件夹
-    if not ENABLE_CATEGORIZATION:
-        return base_folder
-    
-    # 查找分类属性
-    category_value = None
-    category_prop_name = None
-    for prop_name in CATEGORY_PROPERTIES:
-        prop_name = prop_name.strip()  # 移除空格
-        if prop_name in page_properties:
-            category_value = page_properties[prop_name]
-            category_prop_name = prop_name
-            break
-    
-    if category_value:
-        # 检查是否是日期属性，如果是则进行特殊处理
-        date_keywords = ['date', 'time', '日期', '时间', 'full date']
-        is_date_prop = category_prop_name and any(date_keyword in category_prop_name.lower() 
-                                                 for date_keyword in date_keywords)
-        
-        if is_date_prop:
-            # 尝试生成日期范围分类
-            date_category = generate_date_category(category_value)
-            if date_category:
-                category_folder = clean_folder_name(date_category)
-                return f"{base_folder}/{category_folder}"
-        
-        # 如果不是日期属性或日期解析失败，使用原始值
-        category_folder = clean_folder_name(str(category_value))
-        return f"{base_folder}/{category_folder}"
-    else:
-        # 如果没有找到分类属性，使用原来的文件夹
-        return base_folder
 
+def is_embedded_database(db_data):
+    """数据库是否内嵌在页面中：父级是页面或块时，父页面中的 child_database 块会把它渲染为表格"""
+    return (db_data or {}).get('parent', {}).get('type') in ('page_id', 'block_id')
 
-def convert_notion_to_markdown(page_data, content_data, source_info=""):
-    """将Notion页面转换为Markdown格式"""
-    title = get_page_title(page_data)
 
-    if not title:
+def get_database_rows(database_id):
+    """获取数据库的行（页面列表），本次运行内与发现阶段共用，失败时返回None"""
+    return get_database_rows_with_projection(database_id)[0]
+
+
+def get_database_rows_with_projection(database_id):
+    """获取数据库的行及其包含的属性名集合（None表示全部属性），失败时返回 (None, None)"""
+    cache_key = normalize_notion_id(database_id)
+    with get_database_fetch_lock(('rows', cache_key)):
+        if cache_key in database_rows_cache:
+            return database_rows_cache[cache_key]
+        # 只请求路由和渲染用到的属性，宽表的公式、汇总、关联等不再下载
+        prop_ids, names = get_database_projection(database_id)
+        notes_data = fetch_notion_notes(database_id, prop_ids)
+        if not notes_data or 'results' not in notes_data:
+            return None, None
+        archive_rows(database_id, notes_data['results'])
+        database_rows_cache[cache_key] = compact_database_rows(database_id, notes_data['results'], names)
+        return database_rows_cache[cache_key]
+
+
+def compact_database_rows(database_id, rows, names):
+    """缓存前裁剪数据库行：只保留ID、父级、时间戳、路由和嵌入表格用到的属性，返回 (行列表, 属性名集合)
+
+    未投影的查询返回全部属性，宽表的公式、汇总、关联等会随行缓存保留到本轮结束，在这里丢弃；
+    内嵌在页面中的数据库保留表格显示的全部列，嵌入表格直接复用这些行。启用归档时保留原始数据。
+    """
+    if NOTION_ARCHIVE_DIR:
+        return rows, names
+    if names is None:
+        db_data = (get_database_info(database_id) or {}).get('data') or {}
+        properties = db_data.get('properties', {})
+        if not properties:
+            return rows, names
+        names = get_row_property_names(properties, is_embedded_database(db_data))
+
+    compact_rows = []
+    for page in rows:
+        row = {key: page[key] for key in ('object', 'id', 'parent', 'created_time', 'last_edited_time') if key in page}
+        row['properties'] = {name: value for name, value in page.get('properties', {}).items() if name in names}
+        compact_rows.append(row)
+    return compact_rows, names
+
+
+def reset_database_rows_cache():
+    """清空行数据缓存（每次同步和常驻模式每轮轮询前调用，结构信息和按行指纹缓存的表格继续复用）"""
+    with database_cache_lock:
+        database_rows_cache.clear()
+        # 流式读取的表格没有行指纹，只在本轮内有效
+        for key in [key for key in database_table_cache if key[1] is None]:
+            del database_table_cache[key]
+
+
+def reset_database_schemas():
+    """清空数据库结构和由它编译的分类计划（常驻模式每轮轮询前调用，属性可能已在Notion中改名或新增）
+
+    查询投影每次由数据库结构计算，结构重新获取后随之更新。
+    """
+    with database_cache_lock:
+        database_info_cache.clear()
+        routing_plans.clear()
+
+
+def get_database_rows_hash(pages, properties):
+    """根据行ID、最后编辑时间和数据库结构计算指纹，内容不变时可复用已渲染的表格"""
+    digest = hashlib.sha1(json.dumps(properties, sort_keys=True).encode('utf-8'))
+    for page in pages:
+        digest.update(f"{page.get('id')}:{page.get('last_edited_time')}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+# 子块不属于当前页面正文的块类型（子页面和子数据库单独同步）
+NESTED_SKIP_BLOCK_TYPES = {'child_page', 'child_database'}
+
+
+def fetch_block_children(block_id):
+    """分页获取块的全部子块，嵌套子块递归获取后挂在 block['children'] 上"""
+    return expand_block_children(list_block_children(block_id))
+
+
+def list_block_children(block_id):
+    """分页获取块的直接子块（不含嵌套子块）"""
+    url = f'https://api.notion.com/v1/blocks/{block_id}/children'
+    params = {'page_size': 100}
+    blocks = []
+
+    while True:
+        response = notion_request('GET', url, params=params)
+        response.raise_for_status()
+        data = response_json(response)
+        blocks.extend(data.get('results', []))
+        if not data.get('has_more'):
+            break
+        params['start_cursor'] = data.get('next_cursor')
+
+    archive_write('blocks', block_id, blocks)
+    return blocks
+
+
+def expand_block_children(blocks):
+    """为带子块的块获取嵌套子块，返回原列表"""
+    mirror_block_assets(blocks)
+    for block in blocks:
+        if block.get('type') == 'synced_block':
+            expand_synced_block(block)
+        elif block.get('has_children') and block.get('type') not in NESTED_SKIP_BLOCK_TYPES:
+            # 编辑嵌套子块不会更新父块的编辑时间，子块总要列出；子树哈希没变时复用缓存的渲染结果
+            block['children'] = fetch_block_children(block['id'])
+            cache_block_children(block)
+
+    return blocks
+
+
+# 需要镜像的附件块类型
+ASSET_BLOCK_TYPES = {'image', 'file', 'pdf'}
+
+
+def mirror_block_assets(blocks):
+    """并发下载一组块中Notion托管的附件，仓库内路径记在块数据的 mirrored_path 上"""
+    if not MIRROR_ASSETS:
+        return
+    assets = [
+        block for block in blocks
+        if block.get('type') in ASSET_BLOCK_TYPES and (block.get(block['type']) or {}).get('type') == 'file'
+    ]
+    if not assets:
+        return
+
+    for block, path in zip(assets, get_asset_executor().map(mirror_asset, assets)):
+        if path:
+            block[block['type']]['mirrored_path'] = path
+
+
+def get_asset_executor():
+    """获取附件下载线程池（所有页面共用，总并发由 asset_limiter 限制）"""
+    global asset_executor
+    with asset_lock:
+        if asset_executor is None:
+            asset_executor = ThreadPoolExecutor(max_workers=max(1, ASSET_DOWNLOAD_CONCURRENCY))
+        return asset_executor
+
+
+def get_asset_index():
+    """获取（首次使用时从文件加载）附件索引"""
+    global asset_index
+    with asset_lock:
+        if asset_index is None:
+            asset_index = {}
+            if ASSET_CACHE_FILE and os.path.exists(ASSET_CACHE_FILE):
+                try:
+                    asset_index = read_json_file(ASSET_CACHE_FILE)
+                except (OSError, ValueError) as e:
+                    safe_print(f"⚠️ 读取附件索引时出错，将重新下载: {e}")
+        return asset_index
+
+
+def mirror_asset(block):
+    """下载单个附件并写入暂存区，返回仓库内路径；块ID和文件大小都没变时不再下载，失败时返回None"""
+    data = block[block['type']]
+    url = data['file'].get('url', '')
+    index = get_asset_index()
+    with asset_lock:
+        entry = index.get(block['id'])
+    max_bytes = ASSET_MAX_SIZE_MB * 1024 * 1024
+
+    try:
+        if entry and get_remote_asset_size(url) == entry['size']:
+            with asset_lock:
+                entry['seen'] = datetime.now().strftime('%Y-%m-%d')
+                asset_stats['reused'] += 1
+            return entry['path']
+
+        response = api_request(asset_session, asset_limiter, 'GET', url, stream=True)
+        response.raise_for_status()
+        if int(response.headers.get('Content-Length') or 0) > max_bytes:
+            response.close()
+            safe_print(f"⚠️ 附件超过 {ASSET_MAX_SIZE_MB:.0f}MB，不镜像: {block['id']}")
+            return None
+        content = response.content
+    except requests.exceptions.RequestException as e:
+        safe_print(f"⚠️ 下载附件 {block['id']} 失败: {e}")
+        return entry['path'] if entry else None
+
+    if len(content) > max_bytes:
+        safe_print(f"⚠️ 附件超过 {ASSET_MAX_SIZE_MB:.0f}MB，不镜像: {block['id']}")
+        return None
+
+    # 按内容寻址：相同的文件只存一份
+    blob_sha, size = spool_data(content)
+    extension = get_asset_extension(data.get('name') or urlparse(url).path)
+    path = f"{GITHUB_PATH}/{ASSET_FOLDER}/{blob_sha}{extension}"
+    with asset_lock:
+        index[block['id']] = {'size': size, 'path': path, 'seen': datetime.now().strftime('%Y-%m-%d')}
+        asset_stats['downloaded'] += 1
+        pending_asset_files[path] = {
+            'path': path,
+            'filename': blob_sha,
+            'extension': extension,
+            'blob_sha': blob_sha,
+            'size': size
+        }
+    return path
+
+
+def get_remote_asset_size(url):
+    """读取附件大小，失败时返回None
+
+    Notion托管的文件是只对GET签名的S3链接，HEAD请求会返回403，因此只请求第一个字节，
+    从 Content-Range（bytes 0-0/总大小）中读取总大小。
+    """
+    response = api_request(asset_session, asset_limiter, 'GET', url, headers={'Range': 'bytes=0-0'}, stream=True)
+    try:
+        content_range = response.headers.get('Content-Range', '')
+        if response.status_code == 206 and '/' in content_range:
+            total = content_range.rsplit('/', 1)[1]
+            return int(total) if total.isdigit() else None
+        return None
+    finally:
+        response.close()
+
+
+def get_asset_extension(name):
+    """从文件名或URL路径取扩展名（只保留常见的短扩展名）"""
+    extension = posixpath.splitext(name or '')[1].lower()
+    if 1 < len(extension) <= 8 and extension[1:].isalnum():
+        return extension
+    return ''
+
+
+def stage_asset_files():
+    """把新下载的附件加入待提交列表；路径按内容寻址，远端已有同一路径时说明内容相同，不再上传"""
+    with asset_lock:
+        assets = list(pending_asset_files.values())
+        pending_asset_files.clear()
+    if not assets:
+        return 0
+
+    staged_count = 0
+    existing_files = batch_check_github_files([asset['path'] for asset in assets])
+    for asset in assets:
+        existing_info = existing_files.get(asset['path'], {'exists': False})
+        if add_file_to_batch(ASSET_FOLDER, asset['filename'], asset['blob_sha'], asset['size'], existing_info,
+                             extension=asset['extension'], binary=True):
+            staged_count += 1
+    return staged_count
+
+
+def finish_run_caches(committed):
+    """提交结束后保存附件索引和块缓存，committed 表示本次的文件（含附件）是否已提交"""
+    finish_asset_index(committed)
+    save_block_cache(committed)
+
+
+def finish_asset_index(committed):
+    """提交成功后保存附件索引；提交失败时丢弃本轮新增的记录，下次重新下载并上传"""
+    global asset_index
+    with asset_lock:
+        stats = dict(asset_stats)
+        asset_stats.update(downloaded=0, reused=0)
+        if asset_index is None:
+            return
+        if not committed:
+            asset_index = None
+            return
+        cutoff = (datetime.now() - timedelta(days=BLOCK_CACHE_MAX_AGE_DAYS)).strftime('%Y-%m-%d')
+        entries = {block_id: entry for block_id, entry in asset_index.items() if entry.get('seen', '') >= cutoff}
+
+    if ASSET_CACHE_FILE:
+        try:
+            tmp_file = f"{ASSET_CACHE_FILE}.tmp"
+            write_json_file(tmp_file, entries)
+            os.replace(tmp_file, ASSET_CACHE_FILE)
+        except OSError as e:
+            safe_print(f"⚠️ 保存附件索引时出错: {e}")
+    if stats['downloaded'] or stats['reused']:
+        safe_print(f"🖼️ 附件: 下载 {stats['downloaded']} 个，未变化跳过 {stats['reused']} 个，共记录 {len(entries)} 个")
+
+
+def expand_synced_block(block):
+    """同步块：原始块的子块树本轮只获取一次，所有副本共用"""
+    synced_from = (block.get('synced_block') or {}).get('synced_from')
+    source_id = normalize_notion_id(synced_from['block_id'] if synced_from else block['id'])
+
+    with database_cache_lock:
+        lock = synced_block_locks.setdefault(source_id, threading.Lock())
+    with lock:
+        source = synced_block_sources.get(source_id)
+        if source is None:
+            source = load_synced_block_source(block, source_id, synced_from)
+            synced_block_sources[source_id] = source
+            synced_block_stats['sources'] += 1
+        else:
+            synced_block_stats['reused'] += 1
+
+    block['children'] = source['children']
+    for key in ('children_markdown', 'subtree_hash'):
+        if key in source:
+            block[key] = source[key]
+
+
+def load_synced_block_source(block, source_id, synced_from):
+    """获取原始同步块的子块树，本轮只获取一次，所有副本共用
+
+    副本要先读取原始块得到它的编辑时间，再列出原始块的子块；子块总是重新获取，
+    子树哈希（由所有后代的ID和编辑时间组成）未变时复用块缓存中的渲染结果，不重新渲染。
+    """
+    if synced_from is None:
+        if not block.get('has_children'):
+            return {'id': source_id, 'children': []}
+        edited = block.get('last_edited_time')
+    else:
+        try:
+            response = notion_request('GET', f'https://api.notion.com/v1/blocks/{source_id}')
+            response.raise_for_status()
+            edited = response_json(response).get('last_edited_time')
+        except requests.exceptions.RequestException:
+            # 原始块所在页面没有共享给集成时只能读取副本自己的子块
+            return {'id': block['id'], 'children': fetch_block_children(block['id'])}
+
+    source = {'id': source_id, 'last_edited_time': edited, 'children': fetch_block_children(source_id)}
+    cache_block_children(source)
+    return source
+
+
+def reset_synced_blocks():
+    """清空本轮的同步块（每次同步和常驻模式每轮轮询前调用，原始块可能已在别处编辑）"""
+    with database_cache_lock:
+        synced_block_sources.clear()
+        synced_block_locks.clear()
+
+
+def get_page_body(page_data):
+    """获取页面正文：返回 (缓存的正文Markdown, None)，正文可能有变化时返回 (None, 页面内容)
+
+    页面最后编辑时间没变时直接使用缓存；变了（可能只是属性变化）时列出顶层块，并展开带子块的块
+    （编辑嵌套子块不会更新顶层块的编辑时间），顶层块和各子树的哈希都没变就说明正文未变，不再重新渲染。
+    """
+    page_id = page_data['id']
+    entry = None
+    # 启用归档时，正文块还没归档的页面要完整获取一次，离线重新渲染才有数据
+    if BLOCK_CACHE_FILE and (not NOTION_ARCHIVE_DIR or is_archived('blocks', page_id)):
+        cache = get_block_cache()
+        with block_cache_lock:
+            entry = cache.get(page_id)
+            if entry and 'top' in entry and entry['edited'] == page_data.get('last_edited_time'):
+                entry['seen'] = datetime.now().strftime('%Y-%m-%d')
+                block_cache_stats['pages_reused'] += 1
+                return entry['markdown'], None
+
+    try:
+        blocks = expand_block_children(list_block_children(page_id))
+    except requests.exceptions.RequestException as e:
+        safe_print(f"获取页面内容时出错: {e}")
+        return None, None
+
+    if entry and entry.get('top') == get_top_level_signature(blocks):
+        with block_cache_lock:
+            if is_settled(page_data.get('last_edited_time')):
+                entry['edited'] = page_data.get('last_edited_time')
+            entry['seen'] = datetime.now().strftime('%Y-%m-%d')
+            block_cache_stats['pages_reused'] += 1
+        return entry['markdown'], None
+
+    return None, {'results': blocks}
+
+
+def get_top_level_signature(blocks):
+    """正文的签名：顶层块的ID、最后编辑时间、是否有子块，以及展开后的子树哈希"""
+    digest = hashlib.sha1()
+    for block in blocks:
+        digest.update(f"{block.get('id')}:{block.get('last_edited_time')}:{block.get('has_children')}:"
+                      f"{block.get('subtree_hash', '')}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def cache_page_body(page_data, content_data, body):
+    """记录页面正文，子树中含需要访问API的块时不缓存"""
+    if not BLOCK_CACHE_FILE or not content_data or not is_settled(page_data.get('last_edited_time')):
+        return
+    blocks = content_data.get('results', [])
+    if not children_cacheable(blocks):
+        return
+
+    cache = get_block_cache()
+    with block_cache_lock:
+        cache[page_data['id']] = {
+            'edited': page_data.get('last_edited_time'),
+            'top': get_top_level_signature(blocks),
+            'markdown': body,
+            'seen': datetime.now().strftime('%Y-%m-%d')
+        }
+
+
+def children_cacheable(children):
+    """子块及其子树都不含需要访问API的块时可以缓存渲染结果
+
+    同步块的副本也不缓存：原始块在别的页面被编辑时，副本所在的页面和父块的编辑时间不会变化。
+    """
+    for child in children:
+        if child.get('type') in IO_BOUND_BLOCK_TYPES or ('children' in child and 'subtree_hash' not in child):
+            return False
+        if child.get('type') == 'synced_block' and (child.get('synced_block') or {}).get('synced_from'):
+            return False
+    return True
+
+
+def is_settled(edited):
+    """最后编辑时间是否已过去足够久（Notion的编辑时间精确到分钟，同一分钟内的后续编辑不会改变它）"""
+    if not edited:
+        return False
+    try:
+        edited_at = datetime.fromisoformat(edited.replace('Z', '+00:00'))
+    except ValueError:
+        return False
+    return datetime.now(timezone.utc) - edited_at > timedelta(minutes=2)
+
+
+def get_block_cache():
+    """获取（首次使用时从文件加载）块级缓存"""
+    global block_cache
+    with block_cache_lock:
+        if block_cache is None:
+            block_cache = {}
+            if os.path.exists(BLOCK_CACHE_FILE):
+                try:
+                    data = read_json_file(BLOCK_CACHE_FILE)
+                    if data.get('version') == BLOCK_CACHE_VERSION:
+                        block_cache = data.get('blocks', {})
+                except (OSError, ValueError) as e:
+                    safe_print(f"⚠️ 读取块缓存时出错，将重新获取: {e}")
+        return block_cache
+
+
+def reuse_cached_children(block):
+    """子树哈希与缓存一致时用缓存的子块Markdown代替重新渲染，返回是否命中"""
+    cache = get_block_cache()
+    with block_cache_lock:
+        entry = cache.get(block['id'])
+        if not entry or entry.get('hash') != block['subtree_hash']:
+            return False
+        entry['seen'] = datetime.now().strftime('%Y-%m-%d')
+        block_cache_stats['reused'] += 1
+
+    # 缓存中只有子树全部稳定后才记录的条目，哈希相同说明子树仍是当时的状态
+    block['children_markdown'] = entry['markdown']
+    block['subtree_settled'] = True
+    return True
+
+
+def cache_block_children(block):
+    """计算刚获取的子块树的哈希，未变化时复用缓存的渲染结果，否则渲染并记入缓存；子树中含需要访问API的块时不缓存
+
+    编辑嵌套子块只会更新该子块自己的编辑时间，父块的编辑时间不变，
+    因此只凭块自身的编辑时间无法判断子树是否变化，要比较由所有后代的ID和编辑时间组成的子树哈希。
+    """
+    if not BLOCK_CACHE_FILE:
+        return
+    children = block['children']
+    if not children_cacheable(children):
+        return
+
+    # 子树哈希由块自身的ID、编辑时间和各子块的哈希组成（Merkle树）
+    digest = hashlib.sha1(f"{block['id']}:{block.get('last_edited_time')}".encode('utf-8'))
+    for child in children:
+        digest.update((child.get('subtree_hash') or f"{child.get('id')}:{child.get('last_edited_time')}").encode('utf-8'))
+    block['subtree_hash'] = digest.hexdigest()
+    if reuse_cached_children(block):
+        return
+
+    parts = []
+    render_blocks(children, parts)
+    block['children_markdown'] = ''.join(parts)
+
+    # 子树中有刚编辑过的块时，同一分钟内的后续编辑不会改变哈希，暂不缓存
+    block['subtree_settled'] = is_settled(block.get('last_edited_time')) and all(
+        child.get('subtree_settled', is_settled(child.get('last_edited_time'))) for child in children)
+    if not block['subtree_settled']:
+        return
+
+    cache = get_block_cache()
+    with block_cache_lock:
+        cache[block['id']] = {
+            'edited': block.get('last_edited_time'),
+            'hash': block['subtree_hash'],
+            'markdown': block['children_markdown'],
+            'seen': datetime.now().strftime('%Y-%m-%d')
+        }
+        block_cache_stats['fetched'] += 1
+
+
+def save_block_cache(assets_committed=True):
+    """保存块级缓存，清除长时间未见到的块
+
+    本次下载的附件没有提交时，不保存引用了附件的正文：缓存命中会跳过附件镜像，
+    下次运行需要重新获取这些块，附件才会再次下载并上传。
+    """
+    if not BLOCK_CACHE_FILE or block_cache is None:
+        return
+    cutoff = (datetime.now() - timedelta(days=BLOCK_CACHE_MAX_AGE_DAYS)).strftime('%Y-%m-%d')
+    with block_cache_lock:
+        blocks = {
+            block_id: entry for block_id, entry in block_cache.items()
+            if entry.get('seen', '') >= cutoff and (assets_committed or 'notion-asset://' not in entry.get('markdown', ''))
+        }
+        stats = dict(block_cache_stats)
+        block_cache_stats.update(reused=0, fetched=0, pages_reused=0)
+
+    try:
+        tmp_file = f"{BLOCK_CACHE_FILE}.tmp"
+        write_json_file(tmp_file, {'version': BLOCK_CACHE_VERSION, 'blocks': blocks})
+        os.replace(tmp_file, BLOCK_CACHE_FILE)
+    except Exception as e:
+        safe_print(f"⚠️ 保存块缓存时出错: {e}")
+        return
+
+    if stats['reused'] or stats['fetched'] or stats['pages_reused']:
+        safe_print(f"🧱 块缓存: {stats['pages_reused']} 个页面复用正文，复用 {stats['reused']} 个子块树的渲染结果，"
+                   f"重新渲染 {stats['fetched']} 个，共缓存 {len(blocks)} 项")
+
+
+def get_archive_path(kind, object_id, suffix='.json.gz'):
+    """归档文件路径：<归档目录>/<类别>/<对象ID>.json.gz"""
+    return os.path.join(NOTION_ARCHIVE_DIR, kind, normalize_notion_id(object_id) + suffix)
+
+
+def is_archived(kind, object_id):
+    """对象的原始数据是否已在归档中"""
+    return bool(NOTION_ARCHIVE_DIR) and os.path.exists(get_archive_path(kind, object_id))
+
+
+def archive_write(kind, object_id, data):
+    """把原始JSON压缩写入归档（先写临时文件再替换，中断时不会留下半个文件）"""
+    if not NOTION_ARCHIVE_DIR or offline_mode:
+        return
+    path = get_archive_path(kind, object_id)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with gzip.open(tmp_path, 'wb') as f:
+            f.write(json_dumps(data))
+        os.replace(tmp_path, path)
+    except OSError as e:
+        safe_print(f"⚠️ 写入归档时出错: {path} - {e}")
+
+
+def prune_archive(page_ids):
+    """删除归档中本次完整同步没有见到的页面及其顶层块（页面已删除、移出同步范围或不再同步），
+    离线重新渲染时这些页面不会再出现"""
+    pages_dir = os.path.join(NOTION_ARCHIVE_DIR, 'pages') if NOTION_ARCHIVE_DIR else ''
+    if not pages_dir or not os.path.isdir(pages_dir):
+        return
+    keep = {normalize_notion_id(page_id) for page_id in page_ids}
+    removed = 0
+    for name in os.listdir(pages_dir):
+        if not name.endswith('.json.gz') or name[:-len('.json.gz')] in keep:
+            continue
+        page_id = name[:-len('.json.gz')]
+        for kind in ('pages', 'blocks'):
+            try:
+                os.remove(get_archive_path(kind, page_id))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                safe_print(f"⚠️ 清理归档时出错: {page_id} - {e}")
+        removed += 1
+    if removed:
+        safe_print(f"📦 归档: 清理了 {removed} 个本次同步中已不存在的页面")
+
+
+def archive_read(kind, object_id):
+    """读取归档中的原始JSON，不存在时返回None"""
+    path = get_archive_path(kind, object_id)
+    if not os.path.exists(path):
+        return None
+    with gzip.open(path, 'rb') as f:
+        return json_loads(f.read())
+
+
+def archive_rows(database_id, rows):
+    """把数据库的全部行写入归档"""
+    for _ in archive_row_stream(database_id, rows):
+        pass
+
+
+def archive_row_stream(database_id, rows):
+    """边产出行边按JSON Lines写入归档，流式读取的大表不必整体驻留内存；没有读完时不替换旧归档"""
+    if not NOTION_ARCHIVE_DIR or offline_mode:
+        yield from rows
+        return
+    path = get_archive_path('rows', database_id, '.jsonl.gz')
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        with gzip.open(tmp_path, 'wb') as f:
+            for row in rows:
+                f.write(json_dumps(row) + b'\n')
+                yield row
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def read_archived_rows(path):
+    """读取归档的数据库行（JSON Lines）"""
+    with gzip.open(path, 'rb') as f:
+        return [json_loads(line) for line in f if line.strip()]
+
+
+def load_archived_block_tree(block_id, missing):
+    """从归档重建块的子块树（与 fetch_block_children 的结构相同），缺失的子块ID记入 missing"""
+    blocks = archive_read('blocks', block_id)
+    if blocks is None:
+        missing.append(block_id)
+        return []
+    for block in blocks:
+        if block.get('type') in ASSET_BLOCK_TYPES and block['id'] in get_asset_index():
+            # 附件已镜像到仓库，使用索引中的路径
+            block[block['type']]['mirrored_path'] = get_asset_index()[block['id']]['path']
+        synced_from = (block.get('synced_block') or {}).get('synced_from') if block.get('type') == 'synced_block' else None
+        if synced_from and is_archived('blocks', synced_from['block_id']):
+            # 同步块副本的内容归档在原始块下
+            block['children'] = load_archived_block_tree(synced_from['block_id'], missing)
+        elif block.get('has_children') and block.get('type') not in NESTED_SKIP_BLOCK_TYPES:
+            block['children'] = load_archived_block_tree(block['id'], missing)
+    return blocks
+
+
+def get_page_title(page_data):
+    """从页面数据中提取标题"""
+    if isinstance(page_data, PageRecord):
+        return page_data.title
+    if 'properties' in page_data:
+        for prop_name, prop_data in page_data['properties'].items():
+            if prop_data['type'] == 'title' and 'title' in prop_data:
+                if prop_data['title']:
+                    return prop_data['title'][0]['plain_text']
+                break
+
+    # 如果没有找到title属性，尝试从其他地方获取
+    if 'title' in page_data and page_data['title']:
+        return page_data['title'][0]['plain_text'] if isinstance(page_data['title'], list) else str(page_data['title'])
+
+    return ""
+
+
+def get_page_properties(page_data):
+    """从页面数据中提取属性，返回只在访问时才解析对应属性的只读映射"""
+    if isinstance(page_data, PageRecord):
+        return page_data.properties
+    return PageProperties(page_data.get('properties', {}))
+
+
+def compact_page(page_data):
+    """在入口处把页面JSON转换为紧凑记录；启用归档时需要原始JSON，保持不变"""
+    if NOTION_ARCHIVE_DIR or isinstance(page_data, PageRecord):
+        return page_data
+    return PageRecord(page_data)
+
+
+class PageRecord(Mapping):
+    """页面的紧凑记录：只保留ID、标题、父级、时间戳和解析好的分类属性
+
+    宽表的公式、汇总、关联等属性不再随工作项保留到渲染结束；按映射方式读取 id、parent 等字段，
+    标题和属性通过 get_page_title / get_page_properties 读取。
+    """
+    __slots__ = ('id', 'title', 'parent', 'created_time', 'last_edited_time', 'properties')
+    KEYS = ('id', 'parent', 'created_time', 'last_edited_time')
+
+    def __init__(self, page_data):
+        self.id = page_data['id']
+        self.title = get_page_title(page_data)
+        self.parent = page_data.get('parent', {})
+        self.created_time = page_data.get('created_time', '')
+        self.last_edited_time = page_data.get('last_edited_time', '')
+        properties = get_page_properties(page_data)
+        names = (name.strip() for name in CATEGORY_PROPERTIES)
+        self.properties = {name: properties[name] for name in names if name in properties}
+
+    def __getitem__(self, key):
+        if key not in self.KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self):
+        return iter(self.KEYS)
+
+    def __len__(self):
+        return len(self.KEYS)
+
+
+class PageProperties(Mapping):
+    """页面属性的惰性视图：路由和表格只解析自己用到的属性，其余属性保持原样"""
+    __slots__ = ('raw', 'parsed')
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.parsed = {}
+
+    def get_value(self, name):
+        if name not in self.parsed:
+            prop_data = self.raw.get(name)
+            self.parsed[name] = parse_property_value(prop_data) if prop_data else None
+        return self.parsed[name]
+
+    def __getitem__(self, name):
+        value = self.get_value(name)
+        if value is None:
+            raise KeyError(name)
+        return value
+
+    def __contains__(self, name):
+        return self.get_value(name) is not None
+
+    def __iter__(self):
+        return (name for name in self.raw if name in self)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+def parse_property_value(prop_data):
+    """解析单个属性的显示值，没有值时返回None"""
+    prop_type = prop_data.get('type', '')
+    
+    if prop_type == 'select' and 'select' in prop_data and prop_data['select']:
+        return prop_data['select']['name']
+    elif prop_type == 'multi_select' and 'multi_select' in prop_data:
+        return [item['name'] for item in prop_data['multi_select']]
+    elif prop_type == 'status' and 'status' in prop_data and prop_data['status']:
+        return prop_data['status']['name']
+    elif prop_type == 'rich_text' and 'rich_text' in prop_data and prop_data['rich_text']:
+        return prop_data['rich_text'][0]['plain_text']
+    elif prop_type == 'number' and 'number' in prop_data and prop_data['number'] is not None:
+        return str(prop_data['number'])
+    elif prop_type == 'checkbox' and 'checkbox' in prop_data:
+        return '已完成' if prop_data['checkbox'] else '未完成'
+    elif prop_type == 'date' and 'date' in prop_data and prop_data['date']:
+        return prop_data['date']['start']
+    elif prop_type == 'url' and 'url' in prop_data and prop_data['url']:
+        return prop_data['url']
+    elif prop_type == 'title' and 'title' in prop_data and prop_data['title']:
+        return prop_data['title'][0]['plain_text']
+    elif prop_type == 'formula' and 'formula' in prop_data:
+        # 获取公式计算结果
+        formula_result = prop_data['formula']
+        if formula_result.get('type') == 'string' and formula_result.get('string'):
+            return formula_result['string']
+        elif formula_result.get('type') == 'number' and formula_result.get('number') is not None:
+            return str(formula_result['number'])
+        elif formula_result.get('type') == 'date' and formula_result.get('date'):
+            return formula_result['date']['start']
+    elif prop_type == 'rollup' and 'rollup' in prop_data:
+        # 获取汇总结果
+        rollup_result = prop_data['rollup']
+        if rollup_result.get('type') == 'array' and rollup_result.get('array'):
+            # 处理数组类型的汇总结果
+            array_values = []
+            for item in rollup_result['array']:
+                if item.get('type') == 'rich_text' and item.get('rich_text'):
+                    array_values.append(item['rich_text'][0]['plain_text'])
+            if array_values:
+                return array_values
+        elif rollup_result.get('type') == 'number' and rollup_result.get('number') is not None:
+            return str(rollup_result['number'])
+    elif prop_type == 'created_time':
+        return prop_data['created_time']
+    elif prop_type == 'last_edited_time':
+        return prop_data['last_edited_time']
+
+    return None
+
+
+def generate_folder_path(database_title, page_properties, parent_title=None, plan=None):
+    """根据数据库标题、父页面标题和页面属性生成文件夹路径，plan 为数据库的分类计划（默认不按结构过滤）"""
+    base_folder = get_base_folder(database_title, parent_title)
+
+    # 如果禁用分类，直接返回基础文件夹
+    if not ENABLE_CATEGORIZATION:
+        return base_folder
+
+    # 如果没有找到分类属性，使用原来的文件夹
+    category_folder = (plan or get_routing_plan()).category_folder(page_properties)
+    return f"{base_folder}/{category_folder}" if category_folder else base_folder
+
+
+@lru_cache(maxsize=4096)
+def get_base_folder(database_title, parent_title=None):
+    """基础文件夹：有父页面时使用 父页面/数据库 的结构"""
+    if parent_title:
+        return f"{clean_folder_name(parent_title)}/{clean_folder_name(database_title)}"
+    return clean_folder_name(database_title)
+
+
+# 属性名包含这些关键字时按日期分组
+DATE_PROPERTY_KEYWORDS = ('date', 'time', '日期', '时间', 'full date')
+
+
+class RoutingPlan:
+    """按数据库编译一次的分类计划：按优先级排列的候选分类属性，以及各属性是否按日期分组
+
+    CATEGORY_PROPERTIES 的清理、日期关键字判断和按数据库结构的过滤都只做一次，
+    路由每个页面时只需找到第一个存在的候选属性，再查分类值的文件夹名缓存。
+    """
+    __slots__ = ('candidates',)
+
+    def __init__(self, schema=None):
+        names = [name.strip() for name in CATEGORY_PROPERTIES]
+        if schema is not None:
+            names = [name for name in names if name in schema]
+        self.candidates = tuple(
+            (name, any(keyword in name.lower() for keyword in DATE_PROPERTY_KEYWORDS)) for name in names
+        )
+
+    def category_folder(self, page_properties):
+        """返回页面的分类文件夹名，第一个存在的分类属性为空值或没有分类属性时返回None"""
+        for name, is_date in self.candidates:
+            if name in page_properties:
+                value = page_properties[name]
+                return get_category_folder(str(value), is_date) if value else None
+        return None
+
+
+def get_routing_plan(database_id=None):
+    """获取数据库的分类计划，首次使用时根据已缓存的数据库结构编译"""
+    key = normalize_notion_id(database_id) if database_id else None
+    plan = routing_plans.get(key)
+    if plan is None:
+        database_info = database_info_cache.get(key) if key else None
+        schema = ((database_info or {}).get('data') or {}).get('properties')
+        with database_cache_lock:
+            plan = routing_plans.setdefault(key, RoutingPlan(schema))
+    return plan
+
+
+@lru_cache(maxsize=16384)
+def get_category_folder(value, is_date):
+    """分类值 -> 文件夹名，日期属性按周分组，解析失败时使用原始值；结果按值缓存"""
+    if is_date:
+        date_category = generate_date_category(value)
+        if date_category:
+            return clean_folder_name(date_category)
+    return clean_folder_name(value)
+
+
+def convert_notion_to_markdown(page_data, content_data, source_info="", resolved=None):
+    """将Notion页面转换为Markdown格式，resolved 为预先渲染好的块（块ID -> Markdown）"""
+    return render_page_header(page_data, source_info) + render_page_body(content_data, resolved)
+
+
+def render_page_header(page_data, source_info=""):
+    """渲染页头：标题、来源、时间和分割线（只依赖页面属性）"""
+    title = get_page_title(page_data)
+
+    if not title:
         title = f"页面_{page_data.get('id', 'unknown')}"
 
-    markdown_content = f"# {title}\n\n"
+    parts = [f"# {title}\n\n"]
 
     # 添加来源信息
     if source_info:
-        markdown_content += f"**来源**: {source_info}\n\n"
+        parts.append(f"**来源**: {source_info}\n\n")
 
     # 添加创建时间
     created_time = page_data.get('created_time', '')
     if created_time:
-        markdown_content += f"**创建时间**: {created_time}\n\n"
+        parts.append(f"**创建时间**: {created_time}\n\n")
 
     # 添加最后编辑时间
     last_edited_time = page_data.get('last_edited_time', '')
     if last_edited_time:
-        markdown_content += f"**最后编辑**: {last_edited_time}\n\n"
+        parts.append(f"**最后编辑**: {last_edited_time}\n\n")
 
     # 添加分割线
-    markdown_content += "---\n\n"
+    parts.append("---\n\n")
+    return ''.join(parts)
+
+
+def render_page_body(content_data, resolved=None):
+    """渲染页面正文（只依赖块内容）"""
+    # 各部分先追加到列表，最后一次性拼接，长页面不会因反复拼接字符串而变慢
+    parts = []
+    if content_data and 'results' in content_data:
+        render_blocks(content_data['results'], parts, resolved)
+    return ''.join(parts)
+
+
+# 渲染时需要访问API的块类型
+IO_BOUND_BLOCK_TYPES = {'child_database'}
+
+
+def resolve_render_dependencies(content_data):
+    """预先渲染需要网络请求的块，返回 {块ID: Markdown}，使剩余的渲染可以在子进程中完成"""
+    resolved = {}
+
+    def walk(blocks):
+        for block in blocks:
+            if block.get('type') in IO_BOUND_BLOCK_TYPES:
+                resolved[block.get('id', '')] = convert_block_to_markdown(block)
+            elif block.get('children'):
+                walk(block['children'])
 
-    # 转换内容块
     if content_data and 'results' in content_data:
-        for block in content_data['results']:
-            markdown_content += convert_block_to_markdown(block)
+        walk(content_data['results'])
+    return resolved
 
-    return markdown_content
+
+# 块类型 -> 渲染函数，渲染函数签名为 (块类型数据, 块, 输出列表, 预渲染块)
+BLOCK_RENDERERS = {}
+
+
+def block_renderer(*block_types):
+    """注册块渲染函数的装饰器，新增块类型只需注册，不影响已有类型的分发"""
+    def register(func):
+        for block_type in block_types:
+            BLOCK_RENDERERS[block_type] = func
+        return func
+    return register
+
+
+def render_blocks(blocks, parts, resolved=None):
+    """按注册表渲染块列表，结果追加到 parts"""
+    get_renderer = BLOCK_RENDERERS.get
+    for block in blocks:
+        if resolved and block.get('id') in resolved:
+            parts.append(resolved[block['id']])
+            continue
+
+        block_type = block.get('type', '')
+        renderer = get_renderer(block_type)
+        value = block.get(block_type)
+        if renderer is not None and value is not None:
+            renderer(value, block, parts, resolved)
+        elif 'children' in block:
+            # 未注册的容器块（如分栏）直接展开其子块
+            render_children(block, parts, resolved)
+
+
+def render_children(block, parts, resolved, prefix=''):
+    """渲染嵌套子块（调用方已确认存在），prefix 不为空时给每一行加上缩进或引用前缀"""
+    # 子块树已渲染过（来自块缓存或获取时预渲染）时直接使用
+    markdown = block.get('children_markdown')
+    if not prefix:
+        if markdown is None:
+            render_blocks(block['children'], parts, resolved)
+        else:
+            parts.append(markdown)
+        return
+
+    if markdown is None:
+        child_parts = []
+        render_blocks(block['children'], child_parts, resolved)
+        markdown = ''.join(child_parts)
+
+    blank_prefix = prefix.rstrip()
+    for line in markdown.splitlines(keepends=True):
+        parts.append(prefix + line if line.strip() else blank_prefix + line)
 
 
 def convert_block_to_markdown(block):
     """将单个Notion块转换为Markdown"""
-    block_type = block.get('type', '')
+    parts = []
+    render_blocks([block], parts)
+    return ''.join(parts)
 
-    if block_type == 'paragraph' and 'paragraph' in block:
-        text = extract_text_from_rich_text(block['paragraph'].get('rich_text', []))
-        return f"{text}\n\n"
 
-    elif block_type == 'heading_1' and 'heading_1' in block:
-        text = extract_text_from_rich_text(block['heading_1'].get('rich_text', []))
-        return f"# {text}\n\n"
+@block_renderer('paragraph')
+def render_paragraph(data, block, parts, resolved):
+    parts.append(f"{render_rich_text(data.get('rich_text', []))}\n\n")
+    if 'children' in block:
+        render_children(block, parts, resolved, '    ')
 
-    elif block_type == 'heading_2' and 'heading_2' in block:
-        text = extract_text_from_rich_text(block['heading_2'].get('rich_text', []))
-        return f"## {text}\n\n"
 
-    elif block_type == 'heading_3' and 'heading_3' in block:
-        text = extract_text_from_rich_text(block['heading_3'].get('rich_text', []))
-        return f"### {text}\n\n"
+@block_renderer('heading_1', 'heading_2', 'heading_3')
+def render_heading(data, block, parts, resolved):
+    level = int(block['type'][-1])
+    parts.append(f"{'#' * level} {render_rich_text(data.get('rich_text', []))}\n\n")
+    # 可折叠标题的内容跟在标题后面
+    if 'children' in block:
+        render_children(block, parts, resolved)
 
-    elif block_type == 'bulleted_list_item' and 'bulleted_list_item' in block:
-        text = extract_text_from_rich_text(block['bulleted_list_item'].get('rich_text', []))
-        return f"- {text}\n"
 
-    elif block_type == 'numbered_list_item' and 'numbered_list_item' in block:
-        text = extract_text_from_rich_text(block['numbered_list_item'].get('rich_text', []))
-        return f"1. {text}\n"
+@block_renderer('bulleted_list_item')
+def render_bulleted_list_item(data, block, parts, resolved):
+    parts.append(f"- {render_rich_text(data.get('rich_text', []))}\n")
+    if 'children' in block:
+        render_children(block, parts, resolved, '    ')
 
-    elif block_type == 'code' and 'code' in block:
-        text = extract_text_from_rich_text(block['code'].get('rich_text', []))
-        language = block['code'].get('language', '')
-        caption = extract_text_from_rich_text(block['code'].get('caption', []))
-        
-        # 构建代码块
-        code_block = f"```{language}\n{text}\n```"
-        
-        # 如果有标题，添加到代码块下面作为说明
-        if caption:
-            code_block += f"\n*{caption}*"
-        
-        return code_block + "\n\n"
-
-    elif block_type == 'quote' and 'quote' in block:
-        text = extract_text_from_rich_text(block['quote'].get('rich_text', []))
-        return f"> {text}\n\n"
-
-    elif block_type == 'callout' and 'callout' in block:
-        text = extract_text_from_rich_text(block['callout'].get('rich_text', []))
-        icon = block['callout'].get('icon', {})
-        icon_text = ""
-        if icon.get('type') == 'emoji':
-            icon_text = icon.get('emoji', '') + " "
-        return f"**{icon_text}提示**: {text}\n\n"
-    
-    elif block_type == 'child_database' and 'child_database' in block:
-        # 处理嵌入的数据库
-        db_title = block['child_database'].get('title', '未命名数据库')
-        db_id = block.get('id', '')
-        
-        # 获取数据库内容并转换为表格
-        database_table = convert_database_to_table(db_id, db_title)
-        
-        return f"### 📋 {db_title}\n\n{database_table}\n\n> **说明**: 此数据库内容已同步到 `{db_title}/` 文件夹，每行数据对应一个独立的markdown文件\n\n"
-    
-    elif block_type == 'link_to_page' and 'link_to_page' in block:
-        # 处理页面链接
-        page_info = block['link_to_page']
-        if page_info.get('type') == 'page_id':
-            page_id = page_info.get('page_id', '')
-            return f"🔗 **链接到页面**: `{page_id}`\n\n"
 
-    return ""
+@block_renderer('numbered_list_item')
+def render_numbered_list_item(data, block, parts, resolved):
+    parts.append(f"1. {render_rich_text(data.get('rich_text', []))}\n")
+    if 'children' in block:
+        render_children(block, parts, resolved, '    ')
+
+
+@block_renderer('to_do')
+def render_to_do(data, block, parts, resolved):
+    mark = 'x' if data.get('checked') else ' '
+    parts.append(f"- [{mark}] {render_rich_text(data.get('rich_text', []))}\n")
+    if 'children' in block:
+        render_children(block, parts, resolved, '    ')
+
+
+@block_renderer('toggle')
+def render_toggle(data, block, parts, resolved):
+    parts.append(f"<details>\n<summary>{render_rich_text(data.get('rich_text', []))}</summary>\n\n")
+    if 'children' in block:
+        render_children(block, parts, resolved)
+    parts.append("</details>\n\n")
+
+
+@block_renderer('code')
+def render_code(data, block, parts, resolved):
+    text = extract_text_from_rich_text(data.get('rich_text', []))
+    language = data.get('language', '')
+    caption = extract_text_from_rich_text(data.get('caption', []))
+
+    # 构建代码块
+    parts.append(f"```{language}\n{text}\n```")
+
+    # 如果有标题，添加到代码块下面作为说明
+    if caption:
+        parts.append(f"\n*{caption}*")
+
+    parts.append("\n\n")
+
+
+@block_renderer('quote')
+def render_quote(data, block, parts, resolved):
+    parts.append(f"> {render_rich_text(data.get('rich_text', []))}\n")
+    if 'children' in block:
+        parts.append(">\n")
+        render_children(block, parts, resolved, '> ')
+    parts.append("\n")
+
+
+@block_renderer('callout')
+def render_callout(data, block, parts, resolved):
+    text = render_rich_text(data.get('rich_text', []))
+    icon = data.get('icon') or {}
+    icon_text = ""
+    if icon.get('type') == 'emoji':
+        icon_text = icon.get('emoji', '') + " "
+    parts.append(f"**{icon_text}提示**: {text}\n\n")
+    if 'children' in block:
+        render_children(block, parts, resolved)
+
+
+@block_renderer('synced_block')
+def render_synced_block(data, block, parts, resolved):
+    # 同步块只渲染内容（副本的子块即原始块的子块）
+    if 'children' in block:
+        render_children(block, parts, resolved)
+
+
+@block_renderer('image', 'file', 'pdf')
+def render_asset(data, block, parts, resolved):
+    # 已镜像的附件链接到仓库中的副本，其余（外部链接或镜像失败）使用原始URL
+    path = data.get('mirrored_path')
+    url = f"notion-asset://{path}" if path else (data.get(data.get('type')) or {}).get('url', '')
+    caption = extract_text_from_rich_text(data.get('caption', []))
+    if block['type'] == 'image':
+        parts.append(f"![{caption}]({url})\n\n")
+        return
+    name = data.get('name') or caption or posixpath.basename(urlparse(url).path) or '附件'
+    parts.append(f"📎 [{name}]({url})\n\n")
+    if caption and caption != name:
+        parts.append(f"*{caption}*\n\n")
+
+
+@block_renderer('divider')
+def render_divider(data, block, parts, resolved):
+    # 前面加空行，避免紧跟在段落后被解析为标题下划线
+    parts.append("\n---\n\n")
+
+
+@block_renderer('child_database')
+def render_child_database(data, block, parts, resolved):
+    # 处理嵌入的数据库
+    db_title = data.get('title', '未命名数据库')
+    db_id = block.get('id', '')
+
+    # 获取数据库内容并转换为表格
+    database_table = convert_database_to_table(db_id, db_title)
+
+    parts.append(f"### 📋 {db_title}\n\n{database_table}\n\n> **说明**: 此数据库内容已同步到 `{db_title}/` 文件夹，每行数据对应一个独立的markdown文件\n\n")
+
+
+@block_renderer('link_to_page')
+def render_link_to_page(data, block, parts, resolved):
+    # 处理页面链接
+    if data.get('type') == 'page_id':
+        parts.append(f"🔗 **链接到页面**: {page_link(data.get('page_id', ''))}\n\n")
 
 
 def extract_text_from_rich_text(rich_text_array):
     """从富文本数组中提取纯文本"""
-    text = ""
-    for rich_text in rich_text_array:
-        if 'plain_text' in rich_text:
-            text += rich_text['plain_text']
-    return text
+    return ''.join([rich_text['plain_text'] for rich_text in rich_text_array if 'plain_text' in rich_text])
+
+
+def render_rich_text(rich_text_array):
+    """渲染富文本：提及的页面渲染为页面链接，其余部分取纯文本"""
+    return ''.join([
+        page_link(rich_text['mention']['page']['id'], rich_text['plain_text'])
+        if rich_text.get('type') == 'mention' and rich_text['mention'].get('type') == 'page'
+        else rich_text['plain_text']
+        for rich_text in rich_text_array if 'plain_text' in rich_text
+    ])
 
 
 def convert_database_to_table(database_id, database_title):
-    """将数据库内容转换为markdown表格"""
+    """将数据库内容转换为markdown表格，行数超过阈值时拆分为编号的表格文件"""
     try:
-        # 获取数据库数据
-        notes_data = fetch_notion_notes(database_id)
-        if not notes_data or 'results' not in notes_data:
-            return f"*无法获取数据库 {database_title} 的内容*"
-        
-        pages = notes_data['results']
-        if not pages:
-            return f"*数据库 {database_title} 暂无数据*"
-        
         # 获取数据库信息以了解属性结构
         db_info = get_database_info(database_id)
         if not db_info or not db_info.get('data'):
@@ -733,93 +2569,391 @@ def convert_database_to_table(database_id, database_title):
         
         # 获取属性列表
         properties = db_info['data'].get('properties', {})
-        
-        # 构建表格头部
-        headers = []
-        prop_keys = []
-        
-        # 检查是否有用户自定义的属性配置
-        if DATABASE_TABLE_PROPERTIES:
-            # 使用用户自定义的属性
-            custom_props = [prop.strip() for prop in DATABASE_TABLE_PROPERTIES.split(',') if prop.strip()]
-            for prop_name in custom_props:
-                if prop_name in properties:
-                    # 直接使用用户配置的属性名作为表头
-                    headers.append(prop_name)
-                    prop_keys.append(prop_name)
-        else:
-            # 使用默认的智能选择
-            important_props = ['开发', '标题', 'Status', 'Category', 'Type', '状态', '分类', '类型', 'Full Date', '环境']
-            
-            # 先添加标题类型的属性
-            title_prop = None
-            for prop_name, prop_data in properties.items():
-                if prop_data.get('type') == 'title':
-                    title_prop = prop_name
-                    break
-            
-            if title_prop:
-                headers.append('名称')
-                prop_keys.append(title_prop)
-            
-            # 按重要性添加其他属性
-            for prop_name in important_props:
-                if prop_name in properties and prop_name != title_prop:
-                    headers.append(prop_name)
-                    prop_keys.append(prop_name)
-            
-            # 添加剩余属性（移除列数限制）
-            for prop_name, prop_data in properties.items():
-                if prop_name not in prop_keys:
-                    headers.append(prop_name)
-                    prop_keys.append(prop_name)
-        
+        headers, prop_keys = select_table_columns(properties)
         if not headers:
             return f"*数据库 {database_title} 无可显示的属性*"
+
+        cache_key = normalize_notion_id(database_id)
+        with get_database_fetch_lock(('table', cache_key)):
+            rows, row_properties = database_rows_cache.get(cache_key, (None, None))
+            if rows is not None and (row_properties is None or row_properties.issuperset(prop_keys)):
+                # 发现阶段已获取完整的行，按行指纹复用已渲染的表格
+                fingerprint = get_database_rows_hash(rows, properties)
+                row_iter = sorted(reversed(rows), key=lambda page: page.get('created_time', ''))
+            else:
+                # 未同步的数据库按创建时间流式读取，只请求表格用到的列，本轮内按数据库ID复用
+                fingerprint = None
+                projection = None
+                if len(prop_keys) < len(properties) and not NOTION_ARCHIVE_DIR:
+                    projection = [properties[key]['id'] for key in prop_keys if properties[key].get('id')]
+                row_iter = archive_row_stream(database_id, iter_database_query(
+                    database_id,
+                    {'sorts': [{'timestamp': 'created_time', 'direction': 'ascending'}]},
+                    projection
+                ))
+
+            with database_cache_lock:
+                cached_table = database_table_cache.get((cache_key, fingerprint))
+            if cached_table is not None:
+                return cached_table
+
+            table = render_database_table(database_id, database_title, headers, prop_keys, row_iter)
+            with database_cache_lock:
+                database_table_cache[(cache_key, fingerprint)] = table
+            return table
         
-        # 构建markdown表格
-        table_lines = []
+    except Exception as e:
+        safe_print(f"⚠️ 转换数据库表格时出错: {e}")
+        return f"*转换数据库 {database_title} 为表格时出错*"
+
+
+def select_table_columns(properties):
+    """根据配置选择表格列，返回 (表头列表, 属性名列表)"""
+    headers = []
+    prop_keys = []
+    
+    # 检查是否有用户自定义的属性配置
+    if DATABASE_TABLE_PROPERTIES:
+        # 使用用户自定义的属性
+        custom_props = [prop.strip() for prop in DATABASE_TABLE_PROPERTIES.split(',') if prop.strip()]
+        for prop_name in custom_props:
+            if prop_name in properties:
+                # 直接使用用户配置的属性名作为表头
+                headers.append(prop_name)
+                prop_keys.append(prop_name)
+    else:
+        # 使用默认的智能选择
+        important_props = ['开发', '标题', 'Status', 'Category', 'Type', '状态', '分类', '类型', 'Full Date', '环境']
         
-        # 表格头
-        table_lines.append('| ' + ' | '.join(headers) + ' |')
-        table_lines.append('| ' + ' | '.join(['---'] * len(headers)) + ' |')
+        # 先添加标题类型的属性
+        title_prop = None
+        for prop_name, prop_data in properties.items():
+            if prop_data.get('type') == 'title':
+                title_prop = prop_name
+                break
         
-        # 表格数据行
-        for page in reversed(pages):  # 显示所有行
-            page_properties = get_page_properties(page)
-            row_data = []
-            
-            for prop_key in prop_keys:
-                if prop_key in page_properties:
-                    value = page_properties[prop_key]
-                    # 处理不同类型的值
-                    if isinstance(value, list):
-                        cell_value = ', '.join(str(v) for v in value)
-                    elif isinstance(value, str):
-                        cell_value = value
-                    else:
-                        cell_value = str(value)
-                    
-                    # 不限制单元格长度，显示完整内容
-                    
-                    # 转义markdown特殊字符
-                    cell_value = cell_value.replace('|', '\\|').replace('\n', ' ')
-                    row_data.append(cell_value)
-                else:
-                    row_data.append('-')
-            
-            table_lines.append('| ' + ' | '.join(row_data) + ' |')
+        if title_prop:
+            headers.append('名称')
+            prop_keys.append(title_prop)
         
-        return '\n'.join(table_lines)
+        # 按重要性添加其他属性
+        for prop_name in important_props:
+            if prop_name in properties and prop_name != title_prop:
+                headers.append(prop_name)
+                prop_keys.append(prop_name)
         
-    except Exception as e:
-        safe_print(f"⚠️ 转换数据库表格时出错: {e}")
-        return f"*转换数据库 {database_title} 为表格时出错*"
+        # 添加剩余属性（移除列数限制）
+        for prop_name, prop_data in properties.items():
+            if prop_name not in prop_keys:
+                headers.append(prop_name)
+                prop_keys.append(prop_name)
+
+    return headers, prop_keys
+
+
+def format_table_row(page, prop_keys):
+    """将一行数据格式化为markdown表格行"""
+    page_properties = get_page_properties(page)
+    row_data = []
+    
+    for prop_key in prop_keys:
+        if prop_key in page_properties:
+            value = page_properties[prop_key]
+            # 处理不同类型的值
+            if isinstance(value, list):
+                cell_value = ', '.join(str(v) for v in value)
+            elif isinstance(value, str):
+                cell_value = value
+            else:
+                cell_value = str(value)
+            
+            # 不限制单元格长度，显示完整内容
+            
+            # 转义markdown特殊字符
+            cell_value = cell_value.replace('|', '\\|').replace('\n', ' ')
+            row_data.append(cell_value)
+        else:
+            row_data.append('-')
+    
+    return '| ' + ' | '.join(row_data) + ' |'
+
+
+def render_database_table(database_id, database_title, headers, prop_keys, rows):
+    """逐行渲染表格；超过 DATABASE_TABLE_SPLIT_ROWS 行时每满一批写成一个编号文件，内存中只保留一批"""
+    header_lines = [
+        '| ' + ' | '.join(headers) + ' |',
+        '| ' + ' | '.join(['---'] * len(headers)) + ' |'
+    ]
+    chunk = []
+    table_parts = []  # [(文件路径, 起始行, 结束行)]
+    row_count = 0
+
+    for page in rows:
+        if DATABASE_TABLE_SPLIT_ROWS and len(chunk) >= DATABASE_TABLE_SPLIT_ROWS:
+            table_parts.append(write_table_part(database_id, database_title, header_lines, chunk,
+                                                len(table_parts) + 1, row_count - len(chunk) + 1))
+            chunk = []
+        chunk.append(format_table_row(page, prop_keys))
+        row_count += 1
+
+    if row_count and table_parts:
+        table_parts.append(write_table_part(database_id, database_title, header_lines, chunk,
+                                            len(table_parts) + 1, row_count - len(chunk) + 1))
+    if DATABASE_TABLE_SPLIT_ROWS:
+        stage_stale_table_parts(database_id, database_title, len(table_parts))
+
+    if not row_count:
+        return f"*数据库 {database_title} 暂无数据*"
+    if not table_parts:
+        return '\n'.join(header_lines + chunk)
+
+    lines = [f"*共 {row_count} 行，超过 {DATABASE_TABLE_SPLIT_ROWS} 行，已拆分为 {len(table_parts)} 个表格文件：*", ""]
+    for file_path, first_row, last_row in table_parts:
+        lines.append(f"- [第 {first_row}-{last_row} 行](/{quote(file_path)})")
+    return '\n'.join(lines)
+
+
+def get_table_folder(database_id, database_title):
+    """拆分表格的编号文件所在的文件夹（相对 GITHUB_PATH）"""
+    return f"_tables/{clean_folder_name(database_title)}_{normalize_notion_id(database_id)[:8]}"
+
+
+def stage_stale_table_parts(database_id, database_title, part_count):
+    """列出仓库中该表格已有的编号文件，编号超过本次文件数的登记为待删除
+
+    表格行数减少（或不再需要拆分）时，上次多出来的 part_NNN 文件不会被覆盖，需要随提交一起删除。
+    离线重新渲染时只记录编号文件数，由 rerender_from_archive 根据仓库tree对比。
+    """
+    folder_path = f"{GITHUB_PATH}/{get_table_folder(database_id, database_title)}"
+    if offline_mode:
+        with database_cache_lock:
+            rendered_table_parts[folder_path] = part_count
+        return
+    url = f'https://api.github.com/repos/{GITHUB_OWNER}/{GITHUB_REPO}/contents/{folder_path}'
+    try:
+        response = github_request('GET', url)
+        if response.status_code == 404:
+            return
+        response.raise_for_status()
+        entries = response_json(response)
+    except (requests.exceptions.RequestException, ValueError) as e:
+        safe_print(f"⚠️ 无法列出表格文件夹 {folder_path}: {e}")
+        return
+
+    stale = [
+        entry['path'] for entry in entries if isinstance(entry, dict) and entry.get('type') == 'file'
+        and get_table_part_number(entry.get('name', '')) > part_count
+    ]
+    if stale:
+        with database_cache_lock:
+            pending_deletions.update(stale)
+        safe_print(f"   🗑️ 表格 {database_title} 变短，{len(stale)} 个多余的编号文件将随提交删除")
+
+
+def get_table_part_number(name):
+    """从 part_NNN.md 文件名中取出编号，不是编号文件时返回0"""
+    match = re.fullmatch(r'part_(\d+)\.md', name)
+    return int(match.group(1)) if match else 0
+
+
+def write_table_part(database_id, database_title, header_lines, chunk, part_number, first_row):
+    """把一批表格行写入暂存区并登记为待提交文件，返回 (文件路径, 起始行, 结束行)"""
+    folder_path = get_table_folder(database_id, database_title)
+    filename = f"part_{part_number:03d}"
+    last_row = first_row + len(chunk) - 1
+    content = '\n'.join([
+        f"# {database_title} - 表格 {part_number}",
+        "",
+        f"**来源**: 数据库: {database_title}（第 {first_row}-{last_row} 行）",
+        "",
+        *header_lines,
+        *chunk
+    ]) + '\n'
+    file_path = f"{GITHUB_PATH}/{folder_path}/{filename}.md"
+    blob_sha, size = spool_content(resolve_page_links(content, file_path))
+    with database_cache_lock:
+        pending_table_files[file_path] = {
+            'folder_path': folder_path,
+            'filename': filename,
+            'blob_sha': blob_sha,
+            'size': size,
+            'new_file_path': file_path
+        }
+    return file_path, first_row, last_row
+
+
+def get_git_blob_sha(data):
+    """计算与GitHub一致的git blob SHA，用作暂存区的内容地址"""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return hashlib.sha1(b'blob %d\0' % len(data) + data).hexdigest()
+
+
+def get_spool_dir():
+    """获取（必要时创建）磁盘暂存目录"""
+    global spool_dir
+    with spool_lock:
+        if spool_dir is None:
+            if SPOOL_DIR:
+                os.makedirs(SPOOL_DIR, exist_ok=True)
+                spool_dir = SPOOL_DIR
+            else:
+                spool_dir = tempfile.mkdtemp(prefix='notion_sync_')
+        return spool_dir
+
+
+def spool_content(content):
+    """将渲染好的内容写入磁盘暂存区，返回 (blob_sha, 字节数)"""
+    return spool_data(content.encode('utf-8'))
+
+
+def spool_data(data):
+    """将字节内容（Markdown或附件）写入磁盘暂存区，返回 (blob_sha, 字节数)"""
+    blob_sha = get_git_blob_sha(data)
+    blob_dir = os.path.join(get_spool_dir(), blob_sha[:2])
+    blob_path = os.path.join(blob_dir, blob_sha)
+
+    # 内容寻址：相同内容只写一次
+    if not os.path.exists(blob_path):
+        os.makedirs(blob_dir, exist_ok=True)
+        tmp_path = f"{blob_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, blob_path)
+
+    return blob_sha, len(data)
+
 
+def read_spooled_content(blob_sha):
+    """从磁盘暂存区读取内容，不存在时返回None"""
+    data = read_spooled_data(blob_sha)
+    return data.decode('utf-8') if data is not None else None
 
-def get_file_content_hash(content):
-    """计算文件内容的哈希值"""
-    return hashlib.md5(content.encode('utf-8')).hexdigest()
+
+def read_spooled_data(blob_sha):
+    """从磁盘暂存区读取字节内容，不存在时返回None"""
+    blob_path = os.path.join(get_spool_dir(), blob_sha[:2], blob_sha)
+    if not os.path.exists(blob_path):
+        return None
+    with open(blob_path, 'rb') as f:
+        return f.read()
+
+
+def load_file_content(file_info):
+    """读取待提交文件的内容：优先读暂存区，检查点恢复的文件从GitHub blob取回"""
+    return load_file_data(file_info).decode('utf-8')
+
+
+def load_file_data(file_info):
+    """读取待提交文件的字节内容（附件等二进制文件也适用）"""
+    data = read_spooled_data(file_info['blob_sha'])
+    if data is None:
+        data = get_github_blob_data(file_info['blob_sha'])
+    return data
+
+
+def get_blob_payload(file_info):
+    """创建blob的请求体：文本按utf-8发送，附件等二进制文件按base64发送"""
+    if file_info.get('binary'):
+        return {'content': base64.b64encode(load_file_data(file_info)).decode('ascii'), 'encoding': 'base64'}
+    return {'content': load_file_content(file_info), 'encoding': 'utf-8'}
+
+
+def cleanup_spool():
+    """删除本次运行创建的临时暂存目录"""
+    global spool_dir
+    if spool_dir and not SPOOL_DIR:
+        shutil.rmtree(spool_dir, ignore_errors=True)
+    spool_dir = None
+
+
+def render_page_to_spool(page_data, content_data, source_info, resolved, file_path):
+    """渲染页面并写入暂存区，启用进程池时交给子进程批量处理，返回 (blob_sha, 字节数, 正文Markdown)"""
+    if render_batcher:
+        return render_batcher.render((page_data, content_data, source_info, resolved, file_path))
+    return render_page_job(page_data, content_data, source_info, resolved, file_path)
+
+
+def render_page_job(page_data, content_data, source_info, resolved, file_path):
+    """渲染一个页面并写入暂存区，正文（含占位链接）单独返回以便缓存"""
+    body = render_page_body(content_data, resolved)
+    markdown = render_page_header(page_data, source_info) + body
+    blob_sha, size = spool_content(resolve_page_links(markdown, file_path))
+    return blob_sha, size, body
+
+
+def render_batch_in_process(jobs, spool_path):
+    """在子进程中渲染一批页面：原始块JSON -> Markdown -> 暂存区，返回每页的 (blob_sha, 字节数, 正文)"""
+    global spool_dir
+    # 与主进程共用同一个暂存目录，文件内容不再传回去
+    spool_dir = spool_path
+    return [render_page_job(*job) for job in jobs]
+
+
+class RenderBatcher:
+    """把渲染任务攒批发送到进程池，调用线程阻塞等待自己那一页的结果"""
+
+    def __init__(self, processes, batch_size, flush_delay=0.05):
+        # 创建进程池时发现阶段的分页预取线程已在运行，子进程按需启动时获取线程也在运行，
+        # 从多线程的主进程fork会复制其他线程持有的锁：子进程改由forkserver（不支持时用spawn）启动，
+        # 渲染需要的链接索引通过初始化参数传入，其余内容随任务传入
+        start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        self.executor = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context(start_method),
+                                            initializer=set_link_index, initargs=(link_index,))
+        self.batch_size = max(1, batch_size)
+        self.flush_delay = flush_delay
+        self.lock = threading.Lock()
+        self.jobs = []  # [(任务, Future)]
+        self.timer = None
+        self.batches = 0
+        self.pages = 0
+
+    def render(self, job):
+        """提交一个渲染任务并等待结果"""
+        future = Future()
+        with self.lock:
+            self.jobs.append((job, future))
+            if len(self.jobs) >= self.batch_size:
+                self._flush_locked()
+            elif self.timer is None:
+                # 不满一批时稍等片刻再发送，避免尾部任务一直等待
+                self.timer = threading.Timer(self.flush_delay, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+        return future.result()
+
+    def flush(self):
+        """立即发送当前攒下的任务"""
+        with self.lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if not self.jobs:
+            return
+        batch, self.jobs = self.jobs, []
+        self.batches += 1
+        self.pages += len(batch)
+
+        def deliver(pool_future):
+            try:
+                results = pool_future.result()
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                return
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+        pool_future = self.executor.submit(render_batch_in_process, [job for job, _ in batch], get_spool_dir())
+        pool_future.add_done_callback(deliver)
+
+    def shutdown(self):
+        """发送剩余任务并关闭进程池"""
+        self.flush()
+        self.executor.shutdown(wait=True)
 
 
 def get_existing_file_info(file_path):
@@ -827,14 +2961,10 @@ def get_existing_file_info(file_path):
     url = f'https://api.github.com/repos/{GITHUB_OWNER}/{GITHUB_REPO}/contents/{file_path}'
 
     try:
-        response = github_session.get(url)
+        response = github_request('GET', url)
         if response.status_code == 200:
-            existing_data = response.json()
-            # 解码现有文件内容
-            existing_content = base64.b64decode(existing_data['content']).decode('utf-8')
             return {
-                'sha': existing_data['sha'],
-                'content': existing_content,
+                'sha': response_json(response)['sha'],
                 'exists': True
             }
         else:
@@ -843,60 +2973,95 @@ def get_existing_file_info(file_path):
         return {'exists': False}
 
 
-def should_update_file(new_content, existing_info):
-    """判断是否需要更新文件"""
+def should_update_file(blob_sha, existing_info):
+    """判断是否需要更新文件（比较git blob SHA，无需下载远端内容）"""
     if not existing_info['exists']:
         return True
 
-    # 比较内容哈希
-    new_hash = get_file_content_hash(new_content)
-    existing_hash = get_file_content_hash(existing_info['content'])
+    return blob_sha != existing_info.get('sha')
 
-    return new_hash != existing_hash
 
+def get_display_path(file_info):
+    """提交日志中显示的文件路径（相对 GITHUB_PATH，保留真实扩展名）"""
+    path = file_info['path']
+    return path[len(GITHUB_PATH) + 1:] if path.startswith(f"{GITHUB_PATH}/") else path
 
-def add_file_to_batch(folder_name, filename, content):
-    """将文件添加到批量提交列表"""
-    file_path = f"{GITHUB_PATH}/{folder_name}/{filename}.md"
+
+def add_file_to_batch(folder_name, filename, blob_sha, size, existing_info=None, extension='.md', binary=False, page_id=None):
+    """将已暂存的文件添加到批量提交列表，返回加入的文件信息；无需更新时返回False
+
+    page_id 为文件对应的页面，随检查点保存，恢复后页面移动或删除时据此丢弃旧文件。
+    """
+    file_path = f"{GITHUB_PATH}/{folder_name}/{filename}{extension}"
 
     # 检查文件是否需要更新
-    existing_info = get_existing_file_info(file_path)
+    if existing_info is None:
+        existing_info = get_existing_file_info(file_path)
 
-    if should_update_file(content, existing_info):
+    if should_update_file(blob_sha, existing_info):
         file_info = {
             'path': file_path,
-            'content': content,
+            'blob_sha': blob_sha,
+            'size': size,
             'folder_name': folder_name,
             'filename': filename,
             'sha': existing_info.get('sha') if existing_info['exists'] else None,
-            'is_new': not existing_info['exists']
+            'is_new': not existing_info['exists'],
+            'uploaded': False
         }
+        if binary:
+            file_info['binary'] = True
+        if page_id:
+            file_info['page_id'] = page_id
+        # 启用检查点时立即上传blob，中断后无需重新上传
+        if checkpoint_enabled():
+            file_info['uploaded'] = create_github_blob(file_info) is not None
         pending_files.append(file_info)
-        safe_print(f"📝 待更新: {folder_name}/{filename}.md")
-        return True
+        safe_print(f"📝 待更新: {folder_name}/{filename}{extension}")
+        return file_info
     else:
         return False
 
 
+def create_github_blob(file_info):
+    """为待提交文件创建GitHub blob对象，返回其SHA"""
+    blob_url = f'https://api.github.com/repos/{GITHUB_OWNER}/{GITHUB_REPO}/git/blobs'
+    try:
+        blob_response = github_request('POST', blob_url, json=get_blob_payload(file_info))
+        blob_response.raise_for_status()
+        return response_json(blob_response)['sha']
+    except requests.exceptions.RequestException as e:
+        safe_print(f"⚠️ 创建blob失败，将在提交时重试: {e}")
+        return None
+
+
+def get_github_blob_content(blob_sha):
+    """读取已上传blob的内容（用于恢复检查点后回退到兼容模式）"""
+    return get_github_blob_data(blob_sha).decode('utf-8')
+
+
+def get_github_blob_data(blob_sha):
+    """读取已上传blob的字节内容"""
+    blob_url = f'https://api.github.com/repos/{GITHUB_OWNER}/{GITHUB_REPO}/git/blobs/{blob_sha}'
+    blob_response = github_request('GET', blob_url)
+    blob_response.raise_for_status()
+    return base64.b64decode(response_json(blob_response)['content'])
+
+
 def commit_files_batch():
-    """批量提交所有待更新的文件 - 单次提交"""
-    if not pending_files:
+    """批量提交所有待更新的文件 - 单次提交，返回提交的文件数（含删除的文件）"""
+    if not pending_files and not pending_deletions:
         safe_print("📄 没有文件需要更新")
         return 0
 
     safe_print(f"\n🚀 开始单次批量提交 {len(pending_files)} 个文件...")
 
-    headers = {
-        'Authorization': f'token {GITHUB_TOKEN}',
-        'Accept': 'application/vnd.github.v3+json'
-    }
-
     # 获取仓库信息和默认分支
     repo_url = f'https://api.github.com/repos/{GITHUB_OWNER}/{GITHUB_REPO}'
     try:
-        repo_response = requests.get(repo_url, headers=headers)
+        repo_response = github_request('GET', repo_url)
         repo_response.raise_for_status()
-        default_branch = repo_response.json()['default_branch']
+        default_branch = response_json(repo_response)['default_branch']
         safe_print(f"🌿 检测到默认分支: {default_branch}")
     except Exception as e:
         safe_print(f"⚠️ 无法获取仓库信息: {e}")
@@ -906,16 +3071,16 @@ def commit_files_batch():
     try:
         # 1. 获取当前分支的最新commit
         ref_url = f'https://api.github.com/repos/{GITHUB_OWNER}/{GITHUB_REPO}/git/refs/heads/{default_branch}'
-        ref_response = requests.get(ref_url, headers=headers)
+        ref_response = github_request('GET', ref_url)
         ref_response.raise_for_status()
-        base_commit_sha = ref_response.json()['object']['sha']
+        base_commit_sha = response_json(ref_response)['object']['sha']
         safe_print(f"📍 当前分支最新commit: {base_commit_sha[:8]}")
 
         # 2. 获取基础tree
         commit_url = f'https://api.github.com/repos/{GITHUB_OWNER}/{GITHUB_REPO}/git/commits/{base_commit_sha}'
-        commit_response = requests.get(commit_url, headers=headers)
+        commit_response = github_request('GET', commit_url)
         commit_response.raise_for_status()
-        base_tree_sha = commit_response.json()['tree']['sha']
+        base_tree_sha = response_json(commit_response)['tree']['sha']
         safe_print(f"📁 基础tree: {base_tree_sha[:8]}")
 
         # 3. 准备tree entries
@@ -924,16 +3089,15 @@ def commit_files_batch():
         updated_files = []
 
         for file_info in pending_files:
-            # 创建blob
-            blob_data = {
-                'content': file_info['content'],
-                'encoding': 'utf-8'
-            }
-            
-            blob_url = f'https://api.github.com/repos/{GITHUB_OWNER}/{GITHUB_REPO}/git/blobs'
-            blob_response = requests.post(blob_url, headers=headers, json=blob_data)
-            blob_response.raise_for_status()
-            blob_sha = blob_response.json()['sha']
+            # 创建blob（检查点模式下通常已提前上传）
+            blob_sha = file_info['blob_sha']
+            if not file_info.get('uploaded'):
+                blob_data = get_blob_payload(file_info)
+
+                blob_url = f'https://api.github.com/repos/{GITHUB_OWNER}/{GITHUB_REPO}/git/blobs'
+                blob_response = github_request('POST', blob_url, json=blob_data)
+                blob_response.raise_for_status()
+                blob_sha = response_json(blob_response)['sha']
 
             # 添加到tree entries
             tree_entries.append({
@@ -950,6 +3114,12 @@ def commit_files_batch():
 
         safe_print(f"📦 创建了 {len(tree_entries)} 个blob对象")
 
+        # 表格变短后多出来的编号文件和已删除页面的文件：sha为None的条目表示从tree中删除
+        staged_paths = {file_info['path'] for file_info in pending_files}
+        deletions = sorted(path for path in pending_deletions if path not in staged_paths)
+        for path in deletions:
+            tree_entries.append({'path': path, 'mode': '100644', 'type': 'blob', 'sha': None})
+
         # 4. 创建新tree
         tree_data = {
             'base_tree': base_tree_sha,
@@ -957,23 +3127,31 @@ def commit_files_batch():
         }
 
         tree_url = f'https://api.github.com/repos/{GITHUB_OWNER}/{GITHUB_REPO}/git/trees'
-        tree_response = requests.post(tree_url, headers=headers, json=tree_data)
+        tree_response = github_request('POST', tree_url, json=tree_data)
         tree_response.raise_for_status()
-        new_tree_sha = tree_response.json()['sha']
+        new_tree_sha = response_json(tree_response)['sha']
         safe_print(f"�� 创建新tree: {new_tree_sha[:8]}")
 
         # 5. 生成commit message
-        commit_message = f"🔄 Notion同步 - 批量更新 {len(pending_files)} 个文件"
+        if pending_files:
+            commit_message = f"🔄 Notion同步 - 批量更新 {len(pending_files)} 个文件"
+        else:
+            commit_message = f"🔄 Notion同步 - 删除 {len(deletions)} 个文件"
 
         if new_files:
             commit_message += f"\n\n✨ 新增 {len(new_files)} 个文件:"
             for file_info in new_files:
-                commit_message += f"\n  + {file_info['folder_name']}/{file_info['filename']}.md"
+                commit_message += f"\n  + {get_display_path(file_info)}"
         
         if updated_files:
             commit_message += f"\n\n📝 更新 {len(updated_files)} 个文件:"
             for file_info in updated_files:
-                commit_message += f"\n  📄 {file_info['folder_name']}/{file_info['filename']}.md"
+                commit_message += f"\n  📄 {get_display_path(file_info)}"
+
+        if deletions:
+            commit_message += f"\n\n🗑️ 删除 {len(deletions)} 个文件:"
+            for path in deletions:
+                commit_message += f"\n  - {get_display_path({'path': path})}"
 
         # 6. 创建commit
         commit_data = {
@@ -983,9 +3161,9 @@ def commit_files_batch():
         }
 
         commit_create_url = f'https://api.github.com/repos/{GITHUB_OWNER}/{GITHUB_REPO}/git/commits'
-        commit_create_response = requests.post(commit_create_url, headers=headers, json=commit_data)
+        commit_create_response = github_request('POST', commit_create_url, json=commit_data)
         commit_create_response.raise_for_status()
-        new_commit_sha = commit_create_response.json()['sha']
+        new_commit_sha = response_json(commit_create_response)['sha']
         safe_print(f"💾 创建新commit: {new_commit_sha[:8]}")
 
         # 7. 更新分支引用
@@ -993,12 +3171,13 @@ def commit_files_batch():
             'sha': new_commit_sha
         }
 
-        ref_update_response = requests.patch(ref_url, headers=headers, json=ref_update_data)
+        ref_update_response = github_request('PATCH', ref_url, json=ref_update_data)
         ref_update_response.raise_for_status()
         safe_print(f"🎯 更新分支引用成功")
+        pending_deletions.clear()
 
-        safe_print(f"✅ 单次批量提交完成! 成功提交 {len(pending_files)} 个文件到一个commit中")
-        return len(pending_files)
+        safe_print(f"✅ 单次批量提交完成! 成功提交 {len(pending_files) + len(deletions)} 个文件到一个commit中")
+        return len(pending_files) + len(deletions)
 
     except Exception as e:
         safe_print(f"❌ 单次批量提交失败: {e}")
@@ -1011,50 +3190,57 @@ def commit_files_individually():
     safe_print("🔄 使用兼容模式（每个文件单独提交）...")
 
     success_count = 0
-    headers = {
-        'Authorization': f'token {GITHUB_TOKEN}',
-        'Accept': 'application/vnd.github.v3+json'
-    }
 
     for file_info in pending_files:
         url = f'https://api.github.com/repos/{GITHUB_OWNER}/{GITHUB_REPO}/contents/{file_info["path"]}'
 
+        # 从暂存区读取内容（检查点恢复的文件从GitHub blob取回）
+        try:
+            data = load_file_data(file_info)
+        except Exception as e:
+            safe_print(f"❌ 无法取回文件内容: {file_info['path']} - {e}")
+            continue
+
         # 重新获取最新的SHA以避免冲突
         try:
-            check_response = requests.get(url, headers=headers)
+            check_response = github_request('GET', url)
             if check_response.status_code == 200:
-                current_file = check_response.json()
+                current_file = response_json(check_response)
                 current_sha = current_file['sha']
 
                 # 检查内容是否真的不同
-                current_content = base64.b64decode(current_file['content']).decode('utf-8')
-                if get_file_content_hash(current_content) == get_file_content_hash(file_info['content']):
+                if current_sha == file_info['blob_sha']:
                     continue
             else:
                 current_sha = None
         except:
             current_sha = file_info.get('sha')
 
-        encoded_content = base64.b64encode(file_info['content'].encode('utf-8')).decode('utf-8')
+        encoded_content = base64.b64encode(data).decode('utf-8')
 
-        data = {
-            'message': f'更新笔记: {file_info["folder_name"]}/{file_info["filename"]}',
+        put_data = {
+            'message': f'更新笔记: {get_display_path(file_info)}',
             'content': encoded_content
         }
 
         if current_sha:
-            data['sha'] = current_sha
+            put_data['sha'] = current_sha
 
         try:
-            response = requests.put(url, headers=headers, json=data)
+            response = github_request('PUT', url, json=put_data)
             response.raise_for_status()
-            safe_print(f"✅ 单独提交: {file_info['folder_name']}/{file_info['filename']}.md")
+            safe_print(f"✅ 单独提交: {get_display_path(file_info)}")
             success_count += 1
         except requests.exceptions.RequestException as e:
             if "409" in str(e):
-                safe_print(f"⚠️ 文件冲突，跳过: {file_info['folder_name']}/{file_info['filename']}.md")
+                safe_print(f"⚠️ 文件冲突，跳过: {get_display_path(file_info)}")
             else:
-                safe_print(f"❌ 提交失败: {file_info['folder_name']}/{file_info['filename']}.md - {e}")
+                safe_print(f"❌ 提交失败: {get_display_path(file_info)} - {e}")
+
+    # 表格变短后多出来的编号文件和已删除页面的文件
+    for path in sorted(pending_deletions):
+        delete_github_file(path)
+    pending_deletions.clear()
 
     return success_count
 
@@ -1079,8 +3265,8 @@ def clean_filename(filename):
     return filename
 
 
-def process_database(database_info, db_index, total_dbs, file_mapping, database_page_ids=None):
-    """处理单个数据库 - 优化版本"""
+def collect_database_items(database_info, db_index, total_dbs, database_page_ids=None):
+    """获取数据库中的页面，生成待处理的工作项"""
     database_id = database_info['id']
     database_title = database_info['title']
     parent_title = database_info.get('parent_title')
@@ -1089,96 +3275,155 @@ def process_database(database_info, db_index, total_dbs, file_mapping, database_
     if parent_title:
         safe_print(f"   🔗 父页面: {parent_title}")
 
-    # 获取数据库中的笔记
-    notes_data = fetch_notion_notes(database_id)
-    if not notes_data:
+    # 获取数据库中的笔记（缓存后嵌入表格渲染时直接复用）
+    pages = get_database_rows(database_id)
+    if pages is None:
         safe_print(f"❌ 无法获取数据库 {database_id} 的笔记")
-        return 0
+        return []
 
-    # 处理每个页面
-    pages = notes_data.get('results', [])
-    safe_print(f"📄 找到 {len(pages)} 个页面，开始并行处理...")
+    safe_print(f"📄 找到 {len(pages)} 个页面")
 
     # 收集页面ID用于独立页面去重
     if database_page_ids is not None:
         for page in pages:
             database_page_ids.add(page['id'])
 
-    # 并行处理页面
+    folder_prefix = database_info.get('folder_prefix')
+    return [make_work_item(page, 'database', database_title, parent_title, folder_prefix, database_id) for page in pages]
+
+
+def process_work_items(work_items, file_mapping):
+    """并行处理工作项，返回 (需要同步的页面数, 因时间预算推迟的页面ID列表)"""
+    if not work_items:
+        return 0, []
+
+    safe_print(f"\n⚡ 开始并行处理 {len(work_items)} 个页面...")
+
     processed_count = 0
     folder_stats = {}
     successful_results = []
-    
-    # 限制并发数，避免API限流
-    max_workers = min(8, len(pages))
-    
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        # 提交所有任务
-        future_to_page = {
-            executor.submit(process_page_parallel, page, database_title, parent_title, file_mapping): page 
-            for page in pages
-        }
-        
-        # 收集结果
-        for future in as_completed(future_to_page):
-            result = future.result()
-            if result['success']:
-                successful_results.append(result)
-                
-                # 统计文件夹
-                folder_path = result['folder_path']
-                if folder_path not in folder_stats:
-                    folder_stats[folder_path] = 0
-                folder_stats[folder_path] += 1
-                
-                safe_print(f"   📄 {result['title']} -> {folder_path}")
-            else:
-                safe_print(f"   ❌ 处理页面失败: {result.get('error', '未知错误')}")
+    deferred_ids = []
 
-    # 批量处理文件
-    if successful_results:
+    def stage_results(results):
+        """对比远端文件并加入待提交列表，同时记录检查点"""
+        staged_count = 0
         if BATCH_COMMIT:
             # 先批量检查文件状态
-            file_paths = [r['new_file_path'] for r in successful_results]
+            file_paths = [r['new_file_path'] for r in results]
             existing_files = batch_check_github_files(file_paths)
-            
-            for result in successful_results:
+
+            for result in results:
                 file_path = result['new_file_path']
                 existing_info = existing_files.get(file_path, {'exists': False})
-                
-                if should_update_file(result['content'], existing_info):
-                    if add_file_to_batch(result['folder_path'], result['filename'], result['content']):
-                        processed_count += 1
+                page_id = result['page_data']['id'] if 'page_data' in result else None
+                discard_restored_file(file_path, page_id)
+
+                file_info = None
+                if should_update_file(result['blob_sha'], existing_info):
+                    file_info = add_file_to_batch(result['folder_path'], result['filename'],
+                                                  result['blob_sha'], result['size'], existing_info, page_id=page_id)
+                    if file_info:
+                        staged_count += 1
+                # 拆分的表格文件不对应页面，不记录检查点；blob上传失败的页面也不记录，
+                # 暂存区不会保留到下次运行，中断后需要重新处理（本次运行仍会在提交时重试上传）
+                if 'page_data' in result and (not file_info or file_info.get('uploaded')):
+                    record_page_checkpoint(result['page_data'], result['folder_path'], result['filename'], file_path)
         else:
             # 串行保存（如果不使用批量提交）
-            for result in successful_results:
-                if save_to_github_immediate(result['folder_path'], result['filename'], result['content']):
-                    processed_count += 1
+            for result in results:
+                content = read_spooled_content(result['blob_sha'])
+                if save_to_github_immediate(result['folder_path'], result['filename'], content):
+                    staged_count += 1
+        return staged_count
+    
+    # 先分配好同名页面的后缀，页面链接再按本次路由结果和映射表解析为相对路径
+    index_output_paths(work_items, file_mapping)
+    set_link_index(build_link_index(work_items, file_mapping))
+
+    # 线程数取上限，实际并发由自适应控制器根据延迟和限流情况调整
+    max_workers = max(1, min(notion_limiter.maximum, len(work_items)))
+
+    # 启用进程池时，线程只负责获取，渲染分批交给子进程，避免GIL限制CPU密集的转换
+    global render_batcher
+    if RENDER_PROCESSES > 0 and len(work_items) > 1:
+        render_batcher = RenderBatcher(RENDER_PROCESSES, RENDER_BATCH_SIZE)
+        safe_print(f"   🧮 渲染进程池: {RENDER_PROCESSES} 个进程，每批 {render_batcher.batch_size} 个页面")
+    
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # 按顺序提交所有任务（线程池先进先出，列表顺序即处理优先级）
+            futures = [executor.submit(process_page_parallel, item, file_mapping) for item in work_items]
+        
+            # 收集结果
+            for future in as_completed(futures):
+                result = future.result()
+                if result['success']:
+                    if not result.get('resumed'):
+                        successful_results.append(result)
+                
+                    # 统计文件夹
+                    folder_path = result['folder_path']
+                    if folder_path not in folder_stats:
+                        folder_stats[folder_path] = 0
+                    folder_stats[folder_path] += 1
+                
+                    safe_print(f"   📄 {result['title']} -> {folder_path}")
+                elif result.get('deferred'):
+                    deferred_ids.append(result['page_id'])
+                else:
+                    safe_print(f"   ❌ 处理页面失败: {result.get('error', '未知错误')}")
+
+                # 启用检查点时分批落盘，中断后已完成的页面无需重做
+                if checkpoint_enabled() and len(successful_results) >= CHECKPOINT_INTERVAL:
+                    processed_count += stage_results(successful_results)
+                    successful_results = []
+    finally:
+        if render_batcher:
+            render_batcher.shutdown()
+            safe_print(f"   🧮 子进程渲染了 {render_batcher.pages} 个页面，共 {render_batcher.batches} 批")
+            render_batcher = None
+
+    # 批量处理文件
+    if successful_results:
+        processed_count += stage_results(successful_results)
+
+    # 嵌入表格拆分出的编号文件
+    with database_cache_lock:
+        table_files = list(pending_table_files.values())
+        pending_table_files.clear()
+    if table_files:
+        safe_print(f"   📋 {len(table_files)} 个拆分的表格文件")
+        processed_count += stage_results(table_files)
+
+    # 新下载的附件
+    asset_count = stage_asset_files()
+    if asset_count:
+        safe_print(f"   🖼️ {asset_count} 个新附件待上传")
 
     # 显示统计
     if folder_stats:
-        safe_print(f"   📁 {len(folder_stats)} 个文件夹，{processed_count}/{len(pages)} 个页面需要同步")
+        safe_print(f"   📁 {len(folder_stats)} 个文件夹，{processed_count}/{len(work_items)} 个页面需要同步")
     else:
-        safe_print(f"   ✅ {processed_count}/{len(pages)} 个页面需要同步")
-    return processed_count
+        safe_print(f"   ✅ {processed_count}/{len(work_items)} 个页面需要同步")
+    if deferred_ids:
+        safe_print(f"   ⏰ 时间预算即将用尽，{len(deferred_ids)} 个页面推迟到下次运行")
+    if synced_block_stats['reused']:
+        safe_print(f"   🔁 同步块: {synced_block_stats['sources']} 个原始块，副本复用 {synced_block_stats['reused']} 次")
+    synced_block_stats.update(sources=0, reused=0)
+    return processed_count, deferred_ids
 
 
 def save_to_github_immediate(folder_name, filename, content):
     """立即保存到GitHub（旧方式，保持兼容）"""
-    headers = {
-        'Authorization': f'token {GITHUB_TOKEN}',
-        'Accept': 'application/vnd.github.v3+json'
-    }
-
     # 构建文件路径，包含文件夹结构
     file_path = f"{GITHUB_PATH}/{folder_name}/{filename}.md"
     url = f'https://api.github.com/repos/{GITHUB_OWNER}/{GITHUB_REPO}/contents/{file_path}'
 
     # 检查文件是否已存在
     try:
-        existing_response = requests.get(url, headers=headers)
+        existing_response = github_request('GET', url)
         if existing_response.status_code == 200:
-            existing_data = existing_response.json()
+            existing_data = response_json(existing_response)
             sha = existing_data['sha']
         else:
             sha = None
@@ -1198,7 +3443,7 @@ def save_to_github_immediate(folder_name, filename, content):
         data['sha'] = sha
 
     try:
-        response = requests.put(url, headers=headers, json=data)
+        response = github_request('PUT', url, json=data)
         response.raise_for_status()
         safe_print(f"✅ 成功保存文件: {folder_name}/{filename}.md")
         return True
@@ -1207,29 +3452,31 @@ def save_to_github_immediate(folder_name, filename, content):
         return False
 
 
-def process_standalone_pages(file_mapping, database_page_ids=None):
-    """处理独立页面（不在数据库中的页面）"""
-    safe_print(f"\n📄 正在搜索所有独立页面...")
+def collect_standalone_items(database_page_ids=None, database_infos=None):
+    """搜索独立页面（不在数据库中的页面），生成待处理的工作项
 
-    # 获取所有页面
-    all_pages = search_all_pages()
-    safe_print(f"🔍 找到 {len(all_pages)} 个页面")
+    启用 CRAWL_CHILD_PAGES 时沿子页面块爬取页面树，爬取到的子数据库信息追加到 database_infos。
+    """
+    if CRAWL_CHILD_PAGES and CRAWL_ROOT_PAGE_IDS:
+        # 指定了根页面时不再搜索整个工作区
+        return crawl_standalone_items(None, database_page_ids, database_infos)
 
     # 如果没有传入数据库页面ID，则获取
     if database_page_ids is None:
         database_ids = get_database_ids()
         database_page_ids = set()
         for database_id in database_ids:
-            notes_data = fetch_notion_notes(database_id)
-            if notes_data and 'results' in notes_data:
-                for page in notes_data['results']:
-                    database_page_ids.add(page['id'])
+            for page in get_database_rows(database_id) or []:
+                database_page_ids.add(page['id'])
 
     safe_print(f"🗂️ 数据库中共有 {len(database_page_ids)} 个页面")
+    safe_print(f"\n📄 正在搜索所有独立页面...")
 
-    # 过滤出真正的独立页面
+    # 边搜索边过滤出真正的独立页面，下一页在处理当前页时已在请求中
+    page_count = 0
     standalone_pages = []
-    for page in all_pages:
+    for page in iter_search_pages():
+        page_count += 1
         page_id = page['id']
         
         # 跳过已经在我们配置的数据库中的页面
@@ -1243,89 +3490,153 @@ def process_standalone_pages(file_mapping, database_page_ids=None):
             parent.get('type') == 'page_id' and 
             parent.get('page_id') not in database_page_ids
         ):
-            standalone_pages.append(page)
+            # 立即转换为紧凑记录，搜索结果的原始JSON不再保留
+            standalone_pages.append(compact_page(page))
 
+    safe_print(f"🔍 找到 {page_count} 个页面")
     safe_print(f"📑 找到 {len(standalone_pages)} 个真正的独立页面")
 
     if not standalone_pages:
         safe_print("✅ 没有找到独立页面")
-        return 0
-
-    # 处理独立页面
-    processed_count = 0
-    folder_stats = {}  # 统计各个文件夹的文件数量
-
-    for i, page in enumerate(standalone_pages, 1):
-        page_id = page['id']
-        title = get_page_title(page)
-
-        if not title:
-            title = f"页面_{page_id[:8]}"
 
-        # 获取页面属性（独立页面也可能有属性）
-        page_properties = get_page_properties(page)
-        
-        # 使用页面标题作为基础文件夹，就像数据库标题一样
-        page_folder = generate_folder_path(title, page_properties)
-        
-        # 统计文件夹
-        if page_folder not in folder_stats:
-            folder_stats[page_folder] = 0
-        folder_stats[page_folder] += 1
+    if CRAWL_CHILD_PAGES:
+        return crawl_standalone_items(standalone_pages, database_page_ids, database_infos)
+
+    return [make_work_item(page, 'standalone') for page in standalone_pages]
+
+
+def discover_standalone_items(database_page_ids, database_infos):
+    """发现独立页面并生成工作项；分片模式下只保留本分片的页面"""
+    standalone_items = collect_standalone_items(database_page_ids, database_infos)
+    if SHARD:
+        # 只保留本分片的页面；父页面是数据库行的子页面不属于独立页面。
+        # 按输出路径分片，同名页面落在同一分片，由 index_output_paths 加后缀区分
+        standalone_items = [
+            item for item in standalone_items
+            if in_current_shard(get_output_path(item)) and not (
+                item['page'].get('parent', {}).get('type') == 'page_id'
+                and is_database_row_page(item['page']['parent']['page_id'])
+            )
+        ]
+        safe_print(f"🧩 本分片负责 {len(standalone_items)} 个独立页面")
+    return standalone_items
+
+
+def crawl_standalone_items(search_pages, database_page_ids=None, database_infos=None):
+    """从根页面开始爬取页面树，生成带层级文件夹的工作项
+
+    search_pages 为搜索到的独立页面：父页面不在其中的作为根页面，爬取没有到达的页面按原方式平铺；
+    为None时使用 CRAWL_ROOT_PAGE_IDS 指定的根页面。
+    """
+    if search_pages is None:
+        root_ids = [page_id.strip() for page_id in CRAWL_ROOT_PAGE_IDS.split(',') if page_id.strip()]
+        roots = [page for page in map(get_page_info, root_ids) if page]
+    else:
+        found_ids = {normalize_notion_id(page['id']) for page in search_pages}
+        roots = [
+            page for page in search_pages
+            if page.get('parent', {}).get('type') != 'page_id'
+            or normalize_notion_id(page['parent'].get('page_id', '')) not in found_ids
+        ]
+
+    # 已由数据库同步的行和数据库不再重复爬取
+    visited = {normalize_notion_id(page_id) for page_id in (database_page_ids or ())}
+    visited.update(normalize_notion_id(database_id) for database_id in get_database_ids())
+    safe_print(f"🕸️ 从 {len(roots)} 个根页面开始爬取子页面...")
+    work_items, crawled_databases = crawl_page_tree(roots, visited)
+
+    # 爬取没有到达的页面（如子页面块嵌在其他块的深层）仍按独立页面处理
+    for page in search_pages or []:
+        if normalize_notion_id(page['id']) not in visited:
+            visited.add(normalize_notion_id(page['id']))
+            work_items.append(make_work_item(page, 'standalone'))
+
+    for i, database_info in enumerate(crawled_databases, 1):
+        if deadline_reached():
+            safe_print(f"⏰ 时间预算即将用尽，跳过剩余 {len(crawled_databases) - i + 1} 个子数据库，下次运行重新爬取")
+            break
+        work_items.extend(collect_database_items(database_info, i, len(crawled_databases), database_page_ids))
+    if database_infos is not None:
+        database_infos.extend(crawled_databases)
+
+    safe_print(f"🕸️ 爬取完成: {len(work_items)} 个页面，{len(crawled_databases)} 个子数据库")
+    return work_items
+
+
+def crawl_page_tree(root_pages, visited):
+    """按层（广度优先）并发爬取 child_page / child_database 块，返回 (页面工作项列表, 子数据库信息列表)
+
+    visited 为已见过的页面和数据库ID（归一化），同一页面被多处链接或出现循环时只处理一次。
+    时间预算即将用尽时停止向下爬取，当前层的页面仍作为工作项返回，处理时推迟到下次运行。
+    """
+    work_items = []
+    crawled_databases = []
+    frontier = []
+    for page in root_pages:
+        if normalize_notion_id(page['id']) not in visited:
+            visited.add(normalize_notion_id(page['id']))
+            frontier.append(make_work_item(page, 'standalone'))
+
+    # 线程数取上限，实际并发由自适应控制器限制
+    with ThreadPoolExecutor(max_workers=max(1, notion_limiter.maximum)) as executor:
+        depth = 0
+        while frontier:
+            safe_print(f"   🕸️ 第 {depth + 1} 层: {len(frontier)} 个页面")
+            work_items.extend(frontier)
+            if deadline_reached():
+                safe_print(f"   ⏰ 时间预算即将用尽，停止爬取，第 {depth + 1} 层的 {len(frontier)} 个页面推迟到下次运行")
+                break
 
-        # 获取页面内容
-        content_data = get_page_content(page_id)
+            child_pages = []  # [(页面ID, 父页面文件夹)]
+            for work_item, children in zip(frontier, executor.map(find_child_objects, frontier)):
+                folder_path = get_page_location(work_item)[1]
+                for block_type, object_id in children:
+                    if normalize_notion_id(object_id) in visited:
+                        continue
+                    visited.add(normalize_notion_id(object_id))
+                    if block_type == 'child_page':
+                        child_pages.append((object_id, folder_path))
+                    else:
+                        database_info = get_database_info(object_id)
+                        if database_info.get('data'):
+                            # 子数据库放在父页面的文件夹下
+                            crawled_databases.append(dict(database_info, parent_title=None, folder_prefix=folder_path))
 
-        # 转换为Markdown
-        source_info = f"独立页面: {title}"
-        markdown_content = convert_notion_to_markdown(page, content_data, source_info)
+            frontier = [
+                make_work_item(page, 'standalone', folder_prefix=folder_path)
+                for (_, folder_path), page in zip(child_pages, executor.map(get_page_info, [page_id for page_id, _ in child_pages]))
+                if page and not page.get('archived') and not page.get('in_trash')
+            ]
+            depth += 1
 
-        # 文件名使用固定名称，因为文件夹已经是页面名称了
-        filename = "content"  # 或者可以使用页面标题，但可能会重复
-        new_file_path = f"{GITHUB_PATH}/{page_folder}/{filename}.md"
+    return work_items, crawled_databases
 
-        # 检查是否需要删除旧位置的文件
-        if page_id in file_mapping:
-            old_file_path = file_mapping[page_id]
-            if old_file_path != new_file_path:
-                safe_print(f"🔄 检测到独立页面位置变更: {page_id}")
-                safe_print(f"   旧位置: {old_file_path}")
-                safe_print(f"   新位置: {new_file_path}")
-                # 删除旧位置的文件
-                delete_github_file(old_file_path)
 
-        # 更新映射表
-        file_mapping[page_id] = new_file_path
+def find_child_objects(work_item):
+    """列出页面中的子页面和子数据库块，返回 [(块类型, ID)]
 
-        # 添加到批量提交列表或立即保存
-        if BATCH_COMMIT:
-            if add_file_to_batch(page_folder, filename, markdown_content):
-                safe_print(f"   📄 {title} -> {page_folder}")
-                processed_count += 1
-        else:
-            if save_to_github_immediate(page_folder, filename, markdown_content):
-                safe_print(f"   📄 {title} -> {page_folder}")
-                processed_count += 1
-    
-    # 显示统计
-    if folder_stats:
-        safe_print(f"   📁 {len(folder_stats)} 个文件夹，{processed_count}/{len(standalone_pages)} 个页面需要同步")
-    else:
-        safe_print(f"   ✅ {processed_count}/{len(standalone_pages)} 个页面需要同步")
-    return processed_count
+    列出的子块结果留在请求缓存中，随后处理页面时直接复用。
+    """
+    found = []
+    pending = [work_item['page']['id']]
+    try:
+        while pending:
+            for block in list_block_children(pending.pop()):
+                if block.get('type') in NESTED_SKIP_BLOCK_TYPES:
+                    found.append((block['type'], block['id']))
+                elif block.get('has_children') and block.get('type') in CRAWL_CONTAINER_BLOCK_TYPES:
+                    pending.append(block['id'])
+    except requests.exceptions.RequestException as e:
+        safe_print(f"⚠️ 爬取页面 {work_item['page']['id']} 的子页面时出错: {e}")
+    return found
 
 
 def check_github_repo_status():
     """检查GitHub仓库状态和分支信息"""
-    headers = {
-        'Authorization': f'token {GITHUB_TOKEN}',
-        'Accept': 'application/vnd.github.v3+json'
-    }
-
     # 检查仓库是否存在
     repo_url = f'https://api.github.com/repos/{GITHUB_OWNER}/{GITHUB_REPO}'
     try:
-        repo_response = requests.get(repo_url, headers=headers)
+        repo_response = github_request('GET', repo_url)
         if repo_response.status_code == 404:
             safe_print(f"❌ 仓库不存在: {GITHUB_OWNER}/{GITHUB_REPO}")
             safe_print(f"💡 请确认：")
@@ -1335,7 +3646,7 @@ def check_github_repo_status():
             return False
         repo_response.raise_for_status()
 
-        repo_data = repo_response.json()
+        repo_data = response_json(repo_response)
         default_branch = repo_data['default_branch']
 
         safe_print(f"✅ 仓库检查通过: {GITHUB_OWNER}/{GITHUB_REPO}")
@@ -1355,20 +3666,387 @@ def check_github_repo_status():
         return False
 
 
+def in_current_shard(notion_id):
+    """按ID（或输出路径）哈希判断数据库或页面是否属于当前分片（结果与运行环境无关）"""
+    if SHARD is None:
+        return True
+    digest = hashlib.md5(normalize_notion_id(notion_id).encode('utf-8')).hexdigest()
+    return int(digest, 16) % SHARD[1] == SHARD[0]
+
+
+def is_database_row_page(page_id):
+    """判断页面是否为已配置数据库中的行（分片模式下本分片只列出了部分数据库）"""
+    page_info = get_page_info(page_id)
+    if not page_info:
+        return False
+    parent = page_info.get('parent', {})
+    configured_ids = {normalize_notion_id(db_id) for db_id in get_database_ids()}
+    return parent.get('type') == 'database_id' and normalize_notion_id(parent.get('database_id')) in configured_ids
+
+
+def get_shard_manifest_path(shard):
+    """分片tree清单的文件路径"""
+    return os.path.join(SHARD_MANIFEST_DIR, f"shard-{shard[0]}-of-{shard[1]}.json")
+
+
+def upload_pending_blobs():
+    """并行上传尚未上传的blob，分片模式下由合并步骤统一提交"""
+    to_upload = [file_info for file_info in pending_files if not file_info.get('uploaded')]
+    if not to_upload:
+        return True
+
+    def upload(file_info):
+        file_info['uploaded'] = create_github_blob(file_info) is not None
+        return file_info['uploaded']
+
+    with ThreadPoolExecutor(max_workers=github_limiter.maximum) as executor:
+        return all(executor.map(upload, to_upload))
+
+
+def get_branch_head_sha():
+    """获取默认分支最新commit的SHA，失败时返回None"""
+    repo_url = f'https://api.github.com/repos/{GITHUB_OWNER}/{GITHUB_REPO}'
+    try:
+        repo_response = github_request('GET', repo_url)
+        repo_response.raise_for_status()
+        default_branch = response_json(repo_response)['default_branch']
+        ref_response = github_request('GET', f'{repo_url}/git/refs/heads/{default_branch}')
+        ref_response.raise_for_status()
+        return response_json(ref_response)['object']['sha']
+    except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+        safe_print(f"⚠️ 无法获取默认分支的最新commit: {e}")
+        return None
+
+
+def write_shard_manifest(mapping_updates, deferred_ids, base_sha, seen_page_ids, complete):
+    """写出当前分片的tree清单：已上传的blob条目 + 映射表变更，并记录运行标识和分片开始时的基础commit
+
+    同时记录本分片见到的页面ID，以及本分片是否完整同步，合并时据此清理已删除的页面。
+    """
+    manifest = {
+        'shard': list(SHARD),
+        'run_id': SHARD_RUN_ID,
+        'base_sha': base_sha,
+        'created_at': datetime.now().isoformat(),
+        'entries': [
+            {k: file_info[k] for k in ('path', 'blob_sha', 'folder_name', 'filename', 'is_new')}
+            for file_info in pending_files
+        ],
+        'file_mapping': mapping_updates,
+        # 页面文件的路径 -> 页面ID，合并时检查不同分片的页面是否写入了同一路径
+        'owners': {
+            file_info['path']: output_path_owners[file_info['path']]
+            for file_info in pending_files if file_info['path'] in output_path_owners
+        },
+        'deletions': sorted(pending_deletions),
+        'deferred': list(deferred_ids),
+        'seen': sorted({normalize_notion_id(page_id) for page_id in seen_page_ids}),
+        'complete': complete
+    }
+    os.makedirs(SHARD_MANIFEST_DIR, exist_ok=True)
+    manifest_path = get_shard_manifest_path(SHARD)
+    tmp_path = f"{manifest_path}.tmp"
+    write_json_file(tmp_path, manifest)
+    os.replace(tmp_path, manifest_path)
+    return manifest_path
+
+
+def merge_shard_manifests():
+    """合并所有分片的tree清单，生成一次提交和一次映射表更新"""
+    global pending_files
+
+    safe_print("🧩 开始合并分片清单...")
+    if not all([GITHUB_TOKEN, GITHUB_REPO, GITHUB_OWNER]):
+        safe_print("❌ 错误: 缺少必要的环境变量")
+        return
+    setup_sessions()
+
+    if not os.path.isdir(SHARD_MANIFEST_DIR):
+        safe_print(f"❌ 找不到分片清单目录: {SHARD_MANIFEST_DIR}")
+        return
+
+    manifests = []
+    for name in sorted(os.listdir(SHARD_MANIFEST_DIR)):
+        if name.startswith('shard-') and name.endswith('.json'):
+            manifests.append((name, read_json_file(os.path.join(SHARD_MANIFEST_DIR, name))))
+
+    if not manifests:
+        safe_print("❌ 没有找到分片清单")
+        return
+
+    # 所有分片必须来自同一个分片数，且全部完成
+    shard_counts = {manifest['shard'][1] for _, manifest in manifests}
+    if len(shard_counts) != 1:
+        safe_print(f"❌ 分片清单的分片数不一致: {sorted(shard_counts)}")
+        return
+    shard_count = shard_counts.pop()
+    # 来自不同运行或基于不同commit的分片不能混合：映射表变更和新增/更新判断都以分片开始时的仓库为准
+    for key, label in (('run_id', '运行标识'), ('base_sha', '基础commit')):
+        values = {manifest.get(key) for _, manifest in manifests}
+        if len(values) != 1:
+            safe_print(f"❌ 分片清单的{label}不一致，可能混入了其他运行的清单: "
+                       + ', '.join(f"{name}={manifest.get(key)}" for name, manifest in manifests))
+            return
+    present = {manifest['shard'][0] for _, manifest in manifests}
+    missing = sorted(set(range(shard_count)) - present)
+    if missing:
+        safe_print(f"❌ 缺少分片 {missing} 的清单，请确认所有分片都已完成")
+        return
+
+    entries_by_path = {}
+    path_owners = {}  # 路径 -> (页面ID, 清单名)
+    conflicts = []
+    mapping_updates = {}
+    deferred_count = 0
+    for name, manifest in manifests:
+        for path, page_id in manifest.get('owners', {}).items():
+            owner = path_owners.setdefault(path, (page_id, name))
+            if owner[0] != page_id:
+                conflicts.append(f"{path}（{owner[1]}: {owner[0]}，{name}: {page_id}）")
+        for entry in manifest['entries']:
+            if entry['path'] in entries_by_path:
+                safe_print(f"⚠️ 多个分片写入同一路径，保留 {name} 的版本: {entry['path']}")
+            entries_by_path[entry['path']] = dict(entry, uploaded=True)
+        mapping_updates.update(manifest['file_mapping'])
+        pending_deletions.update(manifest.get('deletions', []))
+        deferred_count += len(manifest.get('deferred', []))
+        safe_print(f"   📦 {name}: {len(manifest['entries'])} 个文件，{len(manifest['file_mapping'])} 个映射变更")
+
+    # 不同分片的页面路由到同一路径时，合并任何一方都会覆盖另一方（例如不同分片中同名的数据库）
+    if conflicts:
+        safe_print(f"❌ {len(conflicts)} 个路径被不同分片的页面同时写入，请重命名相关页面或数据库后重新运行分片:")
+        for conflict in conflicts:
+            safe_print(f"   - {conflict}")
+        return
+
+    pending_files = list(entries_by_path.values())
+    safe_print(f"🧩 共 {len(pending_files)} 个文件待提交")
+    if deferred_count:
+        safe_print(f"⏰ 各分片共推迟了 {deferred_count} 个页面或数据库，将在下次运行中处理")
+
+    # 每个分片只见到自己负责的页面：所有分片都完整同步时，按各分片见到的页面的并集清理已删除的页面
+    file_mapping = load_file_mapping()
+    file_mapping.update(mapping_updates)
+    deleted_pages = {}
+    if not all(manifest.get('complete') for _, manifest in manifests):
+        safe_print("⚠️ 有分片没有完整同步（非 all 模式或有推迟的页面），本次跳过已删除页面的清理")
+    elif not NOTION_API_KEY:
+        safe_print("⚠️ 缺少 NOTION_API_KEY，无法确认页面是否已删除，本次跳过已删除页面的清理")
+    else:
+        seen_page_ids = set()
+        for _, manifest in manifests:
+            seen_page_ids.update(manifest.get('seen', []))
+        deleted_pages = clean_deleted_pages(file_mapping, seen_page_ids)
+
+    if SKIP_COMMIT:
+        safe_print(f"\n⏭️ 跳过提交步骤，共准备了 {len(pending_files)} 个文件")
+        return
+
+    if (pending_files or pending_deletions) and commit_files_batch() == 0:
+        safe_print("❌ 合并提交失败，保留分片清单以便重试")
+        return
+
+    # 提交成功后统一更新映射表并清理清单
+    for page_id in deleted_pages:
+        file_mapping.pop(page_id, None)
+    save_file_mapping(file_mapping)
+    for name, _ in manifests:
+        os.remove(os.path.join(SHARD_MANIFEST_DIR, name))
+    safe_print(f"🎉 分片合并完成! {len(pending_files)} 个文件 = 1 个commit，映射表更新 {len(mapping_updates)} 项"
+               + (f"，移除 {len(deleted_pages)} 个已删除的页面" if deleted_pages else ""))
+
+
+def get_repo_tree_blobs():
+    """读取默认分支的完整tree，返回 GITHUB_PATH 下 路径 -> blob SHA"""
+    repo_url = f'https://api.github.com/repos/{GITHUB_OWNER}/{GITHUB_REPO}'
+    repo_response = github_request('GET', repo_url)
+    repo_response.raise_for_status()
+    default_branch = response_json(repo_response)['default_branch']
+
+    tree_url = f'{repo_url}/git/trees/{quote(default_branch)}'
+    tree_response = github_request('GET', tree_url, params={'recursive': '1'})
+    tree_response.raise_for_status()
+    tree_data = response_json(tree_response)
+    if tree_data.get('truncated'):
+        safe_print("⚠️ 仓库tree过大被GitHub截断，对比结果可能不完整")
+
+    prefix = f"{GITHUB_PATH}/"
+    return {
+        entry['path']: entry['sha']
+        for entry in tree_data.get('tree', [])
+        if entry.get('type') == 'blob' and entry['path'].startswith(prefix)
+    }
+
+
+def rerender_from_archive(apply=False, show_diff=False):
+    """离线重新渲染：从归档的原始JSON重建整个Markdown树并与仓库对比，不调用Notion API
+
+    apply 为True时把差异提交到仓库（只访问GitHub），show_diff 为True时输出修改文件的逐行差异。
+    """
+    global offline_mode, pending_files
+    pending_files = []
+    start_time = time.time()
+
+    safe_print("♻️ 开始从归档离线重新渲染...")
+    pages_dir = os.path.join(NOTION_ARCHIVE_DIR, 'pages') if NOTION_ARCHIVE_DIR else ''
+    if not pages_dir or not os.path.isdir(pages_dir):
+        safe_print("❌ 错误: 没有可用的归档，请先设置 NOTION_ARCHIVE_DIR 并正常同步一次")
+        return
+    offline_mode = True
+
+    # 预先装入数据库结构和行数据，嵌入表格直接从归档渲染
+    for kind, suffix in (('databases', '.json.gz'), ('rows', '.jsonl.gz')):
+        kind_dir = os.path.join(NOTION_ARCHIVE_DIR, kind)
+        if not os.path.isdir(kind_dir):
+            continue
+        for name in os.listdir(kind_dir):
+            if not name.endswith(suffix):
+                continue
+            database_id = name[:-len(suffix)]
+            if kind == 'databases':
+                database_info_cache[database_id] = archive_read('databases', database_id)
+            else:
+                database_rows_cache[database_id] = (read_archived_rows(os.path.join(kind_dir, name)), None)
+    safe_print(f"📦 归档中有 {len(database_info_cache)} 个数据库结构，{len(database_rows_cache)} 个数据库的行数据")
+
+    file_mapping = load_file_mapping()
+    rendered = {}  # 文件路径 -> 渲染结果
+    moved = {}  # 页面ID -> (旧路径, 新路径)
+    missing_blocks = []
+
+    work_items = [
+        archive_read('pages', name[:-len('.json.gz')])
+        for name in sorted(os.listdir(pages_dir)) if name.endswith('.json.gz')
+    ]
+    index_output_paths(work_items, file_mapping)
+    set_link_index(build_link_index(work_items, file_mapping))
+
+    for work_item in work_items:
+        page_data = work_item['page']
+        page_id = page_data['id']
+        try:
+            title, folder_path, filename, source_info = get_page_location(work_item)
+            content_data = {'results': load_archived_block_tree(page_id, missing_blocks)}
+            resolved = resolve_render_dependencies(content_data)
+            file_path = f"{GITHUB_PATH}/{folder_path}/{filename}.md"
+            blob_sha, size, _ = render_page_job(page_data, content_data, source_info, resolved, file_path)
+        except Exception as e:
+            safe_print(f"   ❌ 重新渲染页面 {page_id} 时出错: {e}")
+            continue
+
+        if file_path in rendered:
+            safe_print(f"⚠️ 多个页面渲染到同一路径，保留 {page_id}: {file_path}")
+        rendered[file_path] = {'page_id': page_id, 'folder_path': folder_path, 'filename': filename,
+                               'blob_sha': blob_sha, 'size': size}
+        old_file_path = file_mapping.get(page_id)
+        if old_file_path and old_file_path != file_path:
+            moved[page_id] = (old_file_path, file_path)
+
+    # 嵌入表格拆分出的编号文件
+    for file_path, table_file in pending_table_files.items():
+        rendered[file_path] = dict(table_file, page_id=None)
+    pending_table_files.clear()
+
+    safe_print(f"📄 重新渲染了 {len(rendered)} 个文件")
+    if missing_blocks:
+        safe_print(f"⚠️ {len(missing_blocks)} 个块的子块不在归档中，对应内容为空（正常同步一次即可补齐）")
+
+    if RERENDER_OUTPUT_DIR:
+        for file_path, info in rendered.items():
+            local_path = os.path.join(RERENDER_OUTPUT_DIR, *file_path.split('/'))
+            os.makedirs(os.path.dirname(local_path), exist_ok=True)
+            with open(local_path, 'w', encoding='utf-8') as f:
+                f.write(read_spooled_content(info['blob_sha']))
+        safe_print(f"💾 重新渲染结果已写入 {RERENDER_OUTPUT_DIR}/")
+
+    if not all([GITHUB_TOKEN, GITHUB_REPO, GITHUB_OWNER]):
+        safe_print("⚠️ 缺少GitHub配置，跳过与仓库的对比")
+        cleanup_spool()
+        return
+    setup_sessions()
+
+    try:
+        remote_blobs = get_repo_tree_blobs()
+    except (requests.exceptions.RequestException, KeyError) as e:
+        safe_print(f"❌ 读取仓库tree失败: {e}")
+        cleanup_spool()
+        return
+
+    added = sorted(path for path in rendered if path not in remote_blobs)
+    changed = sorted(path for path in rendered
+                     if path in remote_blobs and remote_blobs[path] != rendered[path]['blob_sha'])
+    unchanged_count = len(rendered) - len(added) - len(changed)
+    # 表格变短后仓库中多出来的编号文件
+    stale_parts = sorted(
+        path for path in remote_blobs
+        if posixpath.dirname(path) in rendered_table_parts
+        and get_table_part_number(posixpath.basename(path)) > rendered_table_parts[posixpath.dirname(path)]
+    )
+    rendered_table_parts.clear()
+
+    safe_print(f"\n📊 与仓库对比: 新增 {len(added)} 个，修改 {len(changed)} 个，"
+               f"移动 {len(moved)} 个，删除 {len(stale_parts)} 个，未变 {unchanged_count} 个")
+    for path in added:
+        safe_print(f"   ➕ {path}")
+    for path in changed:
+        safe_print(f"   ✏️ {path}")
+    for path in stale_parts:
+        safe_print(f"   🗑️ {path}")
+    for old_file_path, file_path in moved.values():
+        safe_print(f"   🔄 {old_file_path} -> {file_path}")
+
+    if show_diff:
+        for path in changed:
+            old_lines = get_github_blob_content(remote_blobs[path]).splitlines(keepends=True)
+            new_lines = read_spooled_content(rendered[path]['blob_sha']).splitlines(keepends=True)
+            safe_print(''.join(difflib.unified_diff(old_lines, new_lines, f"a/{path}", f"b/{path}")))
+
+    if apply and (added or changed or moved or stale_parts):
+        for path in added + changed:
+            info = rendered[path]
+            existing_info = {'exists': path in remote_blobs, 'sha': remote_blobs.get(path)}
+            add_file_to_batch(info['folder_path'], info['filename'], info['blob_sha'], info['size'], existing_info)
+        if pending_files and commit_files_batch() == 0:
+            safe_print("❌ 提交失败，映射表保持不变")
+            cleanup_spool()
+            return
+        # 提交成功后再删除移动前的旧文件并更新映射表
+        for page_id, (old_file_path, file_path) in moved.items():
+            if old_file_path in remote_blobs and old_file_path not in rendered:
+                delete_github_file(old_file_path)
+            file_mapping[page_id] = file_path
+        for path in stale_parts:
+            delete_github_file(path)
+        save_file_mapping(file_mapping)
+        safe_print(f"🎉 已把重新渲染的结果提交到仓库")
+    elif not apply and (added or changed or moved or stale_parts):
+        safe_print(f"💡 如需提交这些变化，请运行 python sync.py --rerender --apply")
+
+    cleanup_spool()
+    safe_print(f"\n⏱️ 重新渲染完成，总耗时: {time.time() - start_time:.2f} 秒（未调用Notion API）")
+
+
 def sync_notion_to_github():
     """主同步函数"""
-    global pending_files
+    global pending_files, checkpoint_state
     pending_files = []  # 重置待提交文件列表
+    pending_deletions.clear()
     
     # 开始计时
     start_time = time.time()
+    global run_deadline
+    run_deadline = start_time + SYNC_DEADLINE - SYNC_DEADLINE_RESERVE if SYNC_DEADLINE > 0 else None
 
     safe_print("🚀 开始同步Notion内容到GitHub...")
     safe_print(f"🔧 同步模式: {SYNC_MODE}")
     safe_print(f"📦 批量提交: {'开启' if BATCH_COMMIT else '关闭'}")
     safe_print(f"🚫 跳过提交: {'是' if SKIP_COMMIT else '否'}")
     safe_print(f"📂 文件夹分类: {'开启' if ENABLE_CATEGORIZATION else '关闭'}")
-    safe_print(f"⚡ 并行处理: 已启用 (最大8个并发)")
+    safe_print(f"⚡ 并行处理: 自适应并发 (Notion 最大{notion_limiter.maximum}个, GitHub 最大{github_limiter.maximum}个)")
+    if SYNC_DEADLINE > 0:
+        safe_print(f"⏰ 时间预算: {SYNC_DEADLINE:.0f} 秒 (预留 {SYNC_DEADLINE_RESERVE:.0f} 秒用于提交)")
+    if SHARD:
+        safe_print(f"🧩 分片模式: 第 {SHARD[0]} 片 / 共 {SHARD[1]} 片，清单写入 {SHARD_MANIFEST_DIR}/")
     if ENABLE_CATEGORIZATION:
         safe_print(f"🏷️ 分类属性: {', '.join(CATEGORY_PROPERTIES)}")
     else:
@@ -1379,6 +4057,10 @@ def sync_notion_to_github():
         safe_print("❌ 错误: 缺少必要的环境变量")
         return
 
+    if SHARD and not BATCH_COMMIT:
+        safe_print("❌ 错误: 分片模式需要 BATCH_COMMIT=true（由合并步骤生成单次提交）")
+        return
+
     # 初始化会话
     safe_print("🔧 初始化网络会话...")
     setup_sessions()
@@ -1389,43 +4071,113 @@ def sync_notion_to_github():
         safe_print("❌ GitHub仓库检查失败，请检查配置后重试")
         return
 
+    # 分片模式：记录开始时的基础commit，合并时拒绝混合基于不同commit的清单
+    shard_base_sha = get_branch_head_sha() if SHARD else None
+
     # 加载文件位置映射表
     safe_print(f"📋 加载文件位置映射表...")
     file_mapping = load_file_mapping()
+    original_mapping = dict(file_mapping)
     safe_print(f"📊 当前跟踪 {len(file_mapping)} 个文件位置")
 
-    total_processed = 0
+    # 从检查点恢复上次中断的进度
+    checkpoint_state = load_checkpoint()
+    if checkpoint_state['pages']:
+        pending_files = list(checkpoint_state['pending'])
+        checkpoint_state['restored_paths'] = {f['path'] for f in pending_files}
+        file_mapping.update(checkpoint_state['file_mapping'])
+        safe_print(f"♻️ 从检查点恢复: 已处理 {len(checkpoint_state['pages'])} 个页面，"
+                   f"{len(pending_files)} 个文件已上传待提交")
+
+    # 行数据和同步块每次同步都重新获取
+    reset_database_rows_cache()
+    reset_synced_blocks()
+
     database_page_ids = set()  # 收集数据库页面ID，用于独立页面去重
+    database_infos = []
+    work_items = []
+    skipped_ids = []  # 因时间预算跳过发现的数据库ID（及独立页面发现的标记），与推迟的页面一起记入检查点
+
+    # 上次运行跳过了独立页面的发现时，本次先发现独立页面（数据库页面ID由它自行获取）
+    standalone_first = SYNC_MODE in ['pages', 'all'] and DEFERRED_STANDALONE_DISCOVERY in get_carried_over_ids()
+    if standalone_first:
+        safe_print("⏰ 上次运行因时间预算跳过了独立页面的发现，本次优先处理")
+        work_items.extend(discover_standalone_items(None, database_infos))
 
-    # 同步数据库
+    # 发现数据库页面
     if SYNC_MODE in ['databases', 'all']:
-        database_ids = get_database_ids()
+        database_ids = [database_id for database_id in get_database_ids() if in_current_shard(database_id)]
 
         if database_ids:
             safe_print(f"\n📊 找到 {len(database_ids)} 个数据库要同步")
 
             # 获取所有数据库信息
-            database_infos = []
             for i, database_id in enumerate(database_ids, 1):
                 safe_print(f"🔍 获取数据库 {i}/{len(database_ids)} 信息...")
                 db_info = get_database_info(database_id)
                 database_infos.append(db_info)
                 safe_print(f"  📋 {db_info['title']}")
 
-            # 处理每个数据库
+            # 获取每个数据库的页面（上次因时间预算跳过的数据库优先）
+            carried_over = {normalize_notion_id(notion_id) for notion_id in get_carried_over_ids()}
+            database_infos.sort(key=lambda info: normalize_notion_id(info['id']) not in carried_over)
             for i, database_info in enumerate(database_infos, 1):
-                processed_count = process_database(database_info, i, len(database_infos), file_mapping, database_page_ids)
-                total_processed += processed_count
+                if deadline_reached():
+                    skipped = database_infos[i - 1:]
+                    skipped_ids.extend(info['id'] for info in skipped)
+                    safe_print(f"⏰ 时间预算即将用尽，跳过剩余 {len(skipped)} 个数据库，下次运行优先处理")
+                    break
+                work_items.extend(collect_database_items(database_info, i, len(database_infos), database_page_ids))
         else:
             safe_print("⚠️ 没有配置数据库ID，跳过数据库同步")
 
-    # 同步独立页面
-    if SYNC_MODE in ['pages', 'all']:
-        standalone_processed = process_standalone_pages(file_mapping, database_page_ids)
-        total_processed += standalone_processed
+    # 发现独立页面
+    if SYNC_MODE in ['pages', 'all'] and not standalone_first:
+        if deadline_reached():
+            skipped_ids.append(DEFERRED_STANDALONE_DISCOVERY)
+            safe_print("⏰ 时间预算即将用尽，跳过独立页面的发现，下次运行优先处理")
+        else:
+            work_items.extend(discover_standalone_items(database_page_ids, database_infos))
+
+    # 时间预算模式：最近编辑的页面优先
+    if run_deadline is not None:
+        work_items = prioritize_work_items(work_items)
+
+    total_processed, deferred_ids = process_work_items(work_items, file_mapping)
+    deferred_ids = skipped_ids + deferred_ids
+
+    # 完整同步了所有数据库和独立页面（没有推迟的页面），才能根据本次见到的页面判断哪些页面已不存在
+    complete_run = SYNC_MODE == 'all' and not deferred_ids and not deadline_reached()
+    seen_page_ids = [item['page']['id'] for item in work_items]
+
+    # 清理归档中已不存在的页面，避免离线重新渲染时重新出现
+    if NOTION_ARCHIVE_DIR and complete_run and not SHARD:
+        prune_archive(seen_page_ids)
+
+    # 所有页面处理完毕，保存最终检查点
+    save_checkpoint(force=True)
+
+    # 分片模式：上传blob并写出tree清单，由合并步骤统一提交
+    if SHARD:
+        if not upload_pending_blobs():
+            safe_print("❌ 部分blob上传失败，请重新运行本分片")
+            finish_run_caches(False)
+            return
+        # 附件要等合并步骤提交后才进入仓库，合并可能失败或被拒绝：
+        # 不保存本轮新增的附件记录和引用附件的正文，下次运行重新下载并上传
+        finish_run_caches(False)
+        mapping_updates = {page_id: path for page_id, path in file_mapping.items()
+                           if original_mapping.get(page_id) != path}
+        manifest_path = write_shard_manifest(mapping_updates, deferred_ids, shard_base_sha, seen_page_ids, complete_run)
+        finish_checkpoint([])
+        cleanup_spool()
+        safe_print(f"\n🧩 分片完成! {len(pending_files)} 个文件已上传，清单: {manifest_path}")
+        safe_print(f"💡 所有分片完成后运行 python sync.py --merge-shards 生成提交")
+        print_concurrency_metrics()
+        return
 
     # 清理已删除页面的文件
-    clean_deleted_pages(file_mapping)
+    deleted_pages = clean_deleted_pages(file_mapping, seen_page_ids) if complete_run else {}
 
     # 保存更新后的文件位置映射表
     safe_print(f"\n💾 保存文件位置映射表...")
@@ -1436,28 +4188,234 @@ def sync_notion_to_github():
     if SKIP_COMMIT:
         safe_print(f"\n⏭️ 跳过提交步骤，共准备了 {len(pending_files)} 个文件")
         safe_print(f"💡 如需提交，请设置 SKIP_COMMIT=false 重新运行")
-    elif BATCH_COMMIT and pending_files:
+        finish_run_caches(False)
+    elif BATCH_COMMIT and (pending_files or pending_deletions):
         committed_count = commit_files_batch()
+        finish_run_caches(committed_count > 0)
         if committed_count > 0:
+            forget_deleted_pages(file_mapping, deleted_pages)
+            finish_checkpoint(deferred_ids)
             safe_print(f"\n🎉 同步完成! 所有 {committed_count} 个文件已合并到一次提交中")
             safe_print(f"📊 批量提交：{len(pending_files)} 个文件 = 1 个commit")
         else:
             safe_print(f"\n❌ 批量提交失败，已使用兼容模式")
     elif not BATCH_COMMIT and not SKIP_COMMIT:
         committed_count = commit_files_individually()
+        finish_run_caches(committed_count == len(pending_files))
+        if committed_count == len(pending_files):
+            forget_deleted_pages(file_mapping, deleted_pages)
         safe_print(f"\n🎉 同步完成! 使用兼容模式提交了 {committed_count} 个文件")
     else:
+        finish_run_caches(True)
+        forget_deleted_pages(file_mapping, deleted_pages)
+        finish_checkpoint(deferred_ids)
         safe_print(f"\n🎉 同步完成! 没有文件需要更新")
 
     safe_print(f"📁 文件已保存到GitHub的 {GITHUB_PATH} 文件夹下")
     safe_print(f"📂 文件夹结构: 数据库文件夹 + 独立页面文件夹")
     
+    # 清理磁盘暂存区
+    cleanup_spool()
+
     # 显示性能统计
     end_time = time.time()
     duration = end_time - start_time
     safe_print(f"\n⏱️ 同步完成，总耗时: {duration:.2f} 秒")
-    safe_print(f"🚀 性能优化已启用：并行处理 + 会话复用 + 批量检查")
+    safe_print(f"🚀 性能优化已启用：自适应并发 + 会话复用 + 批量检查")
+    print_concurrency_metrics()
+
+    # 返回运行状态，供常驻模式复用
+    return {
+        'file_mapping': file_mapping,
+        'database_infos': database_infos,
+        'database_page_ids': database_page_ids
+    }
+
+
+def normalize_notion_id(notion_id):
+    """统一Notion ID格式（去掉连字符并转小写），便于比较"""
+    return (notion_id or '').replace('-', '').lower()
+
+
+def search_recently_edited_pages(since):
+    """按最后编辑时间倒序搜索页面，遇到早于since的页面即停止翻页"""
+    url = 'https://api.notion.com/v1/search'
+    recent_pages = []
+    start_cursor = None
+
+    while True:
+        data = {
+            'filter': {
+                'property': 'object',
+                'value': 'page'
+            },
+            'sort': {
+                'direction': 'descending',
+                'timestamp': 'last_edited_time'
+            },
+            'page_size': 100
+        }
+        if start_cursor:
+            data['start_cursor'] = start_cursor
+
+        try:
+            response = notion_request('POST', url, json=data)
+            response.raise_for_status()
+            result = response_json(response)
+        except requests.exceptions.RequestException as e:
+            safe_print(f"轮询最近编辑的页面时出错: {e}")
+            return recent_pages
+
+        for page in result.get('results', []):
+            if page.get('last_edited_time', '') < since:
+                return recent_pages
+            recent_pages.append(page)
+
+        if not result.get('has_more'):
+            return recent_pages
+        start_cursor = result.get('next_cursor')
+
+
+def route_changed_page(page, database_infos_by_id, database_page_ids, file_mapping=None):
+    """把轮询到的变更页面转换为工作项，不属于同步范围的页面返回None"""
+    parent = page.get('parent', {})
+
+    if parent.get('type') == 'database_id':
+        database_info = database_infos_by_id.get(normalize_notion_id(parent.get('database_id')))
+        # 爬取到的子数据库在页面模式下也会同步
+        if database_info and (SYNC_MODE in ['databases', 'all'] or database_info.get('folder_prefix')):
+            database_page_ids.add(page['id'])
+            return make_work_item(page, 'database', database_info['title'], database_info.get('parent_title'),
+                                  database_info.get('folder_prefix'), database_info['id'])
+        return None
+
+    if SYNC_MODE not in ['pages', 'all'] or page['id'] in database_page_ids:
+        return None
+    if parent.get('type') == 'workspace' or (
+        parent.get('type') == 'page_id' and parent.get('page_id') not in database_page_ids
+    ):
+        folder_prefix = None
+        if CRAWL_CHILD_PAGES and parent.get('type') == 'page_id' and file_mapping:
+            # 子页面放在父页面的文件夹下（与爬取时的层级一致）
+            parent_path = file_mapping.get(parent['page_id'], '')
+            if parent_path.endswith('/content.md'):
+                folder_prefix = posixpath.dirname(parent_path)[len(GITHUB_PATH) + 1:]
+        return make_work_item(page, 'standalone', folder_prefix=folder_prefix)
+    return None
+
+
+def format_notion_timestamp(moment):
+    """格式化为Notion的时间戳格式（精确到分钟，与Notion的last_edited_time精度一致）"""
+    return moment.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:00.000Z')
+
+
+def run_daemon():
+    """常驻模式：会话、缓存和映射表保持常热，轮询最近编辑的页面并近实时提交"""
+    global pending_files, run_deadline
+
+    safe_print("🛰️ 以常驻模式启动，先执行一次全量同步...")
+    watermark = format_notion_timestamp(datetime.now(timezone.utc))
+    state = sync_notion_to_github()
+    if not state:
+        return
+
+    file_mapping = state['file_mapping']
+    database_page_ids = state['database_page_ids']
+    database_infos_by_id = {normalize_notion_id(info['id']): info for info in state['database_infos']}
+    run_deadline = None
+
+    # 已成功提交的 (页面ID -> 最后编辑时间)，用于去重：编辑时间只精确到分钟，
+    # 时间未稳定（同一分钟内可能再次编辑）的页面每轮都重新处理，内容没变时按blob SHA跳过，不会产生提交
+    seen_edits = {}
+    # 上一轮提交失败时保留的待提交文件，下一轮与重新处理的结果合并后重试
+    retry_files = []
+    interval = DAEMON_MIN_INTERVAL
+    safe_print(f"\n🛰️ 进入轮询: 间隔 {DAEMON_MIN_INTERVAL:.0f}-{DAEMON_MAX_INTERVAL:.0f} 秒，水位线 {watermark}")
+
+    try:
+        while True:
+            time.sleep(interval)
+            # 每轮轮询都要看到最新数据
+            notion_cache.clear()
+
+            changed_pages = [
+                page for page in search_recently_edited_pages(watermark)
+                if seen_edits.get(page['id']) != page.get('last_edited_time')
+                or not is_settled(page.get('last_edited_time'))
+            ]
+            if not changed_pages and not retry_files:
+                # 空闲时逐步放慢轮询
+                interval = min(DAEMON_MAX_INTERVAL, interval * 2)
+                continue
+
+            cycle_start = time.time()
+            work_items = []
+            for page in changed_pages:
+                work_item = route_changed_page(page, database_infos_by_id, database_page_ids, file_mapping)
+                if work_item:
+                    work_items.append(work_item)
+
+            pending_files = retry_files
+            retry_files = []
+            if work_items:
+                safe_print(f"\n🛰️ 检查 {len(work_items)} 个最近编辑的页面")
+                # 行数据可能已变化，嵌入表格按新的行指纹重新渲染
+                reset_database_rows_cache()
+                reset_synced_blocks()
+                # 属性可能已改名或新增：重新获取本轮涉及的数据库结构，分类计划和查询投影随之更新
+                reset_database_schemas()
+                for database_id in {item['database_id'] for item in work_items if item.get('database_id')}:
+                    get_database_info(database_id)
+                process_work_items(work_items, file_mapping)
+                save_file_mapping(file_mapping)
+            # 重试的文件和重新处理的结果可能是同一路径，保留最新的一份
+            pending_files = list({file_info['path']: file_info for file_info in pending_files}.values())
+
+            # 非批量模式下页面已在处理时逐个提交，剩下的是附件
+            committed = True
+            if pending_files and not SKIP_COMMIT:
+                if BATCH_COMMIT:
+                    committed = commit_files_batch() > 0
+                else:
+                    committed = commit_files_individually() == len(pending_files)
+            finish_run_caches(committed and not (pending_files and SKIP_COMMIT))
+
+            if not committed:
+                # 水位线和去重记录都不前移，下一轮重新检测这些页面并重试提交
+                retry_files = pending_files
+                pending_files = []
+                safe_print(f"⚠️ 本轮提交失败，{len(retry_files)} 个文件将在下一轮重试")
+                continue
+
+            if BATCH_COMMIT:
+                finish_checkpoint([])
+            # 内容确有变化时加快轮询，重新处理后内容未变的页面视为空闲
+            if pending_files:
+                interval = max(DAEMON_MIN_INTERVAL, interval / 2)
+            else:
+                interval = min(DAEMON_MAX_INTERVAL, interval * 2)
+            pending_files = []
+
+            # 提交成功后水位线前移，并清理不再需要的去重记录
+            for page in changed_pages:
+                seen_edits[page['id']] = page.get('last_edited_time')
+            if changed_pages:
+                watermark = max(watermark, max(page.get('last_edited_time', '') for page in changed_pages))
+            seen_edits = {page_id: edited for page_id, edited in seen_edits.items() if edited >= watermark}
+            cleanup_spool()
+            safe_print(f"🛰️ 本轮完成，耗时 {time.time() - cycle_start:.2f} 秒，下次轮询间隔 {interval:.0f} 秒")
+    except KeyboardInterrupt:
+        safe_print("\n🛑 常驻模式已停止")
+        cleanup_spool()
+        print_concurrency_metrics()
 
 
 if __name__ == '__main__':
-    sync_notion_to_github()
\ No newline at end of file
+    if SHARD_MERGE or '--merge-shards' in sys.argv:
+        merge_shard_manifests()
+    elif '--rerender' in sys.argv:
+        rerender_from_archive(apply='--apply' in sys.argv, show_diff='--diff' in sys.argv)
+    elif SYNC_DAEMON or '--daemon' in sys.argv:
+        run_daemon()
+    else:
+        sync_notion_to_github()
\ No newline at end of file
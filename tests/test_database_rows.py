@@ -0,0 +1,133 @@
+import json
+import os
+import sys
+import unittest
+from unittest import mock
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import sync  # noqa: E402
+
+DATABASE_ID = 'a' * 32
+PARENT_PAGE_ID = 'b' * 32
+
+
+def rich_text(text):
+    return [{'type': 'text', 'plain_text': text, 'text': {'content': text}}]
+
+
+def make_row(i, name, env, notes):
+    return {
+        'object': 'page',
+        'id': f'{i:032x}',
+        'created_time': f'2024-01-01T00:0{i}:00.000Z',
+        'last_edited_time': '2024-01-02T00:00:00.000Z',
+        'parent': {'type': 'database_id', 'database_id': DATABASE_ID},
+        'properties': {
+            '开发': {'id': 'title', 'type': 'title', 'title': rich_text(name)},
+            '环境': {'id': 'env', 'type': 'rich_text', 'rich_text': rich_text(env)},
+            'Notes': {'id': 'nts', 'type': 'rich_text', 'rich_text': rich_text(notes)}
+        }
+    }
+
+
+class FakeNotion:
+    """内嵌在页面中、同时也在同步范围内的数据库"""
+
+    def __init__(self):
+        self.rows = [make_row(1, 'Python', 'PyCharm', 'a'), make_row(2, 'Go', 'GoLand', 'b')]
+        self.queries = []
+
+    def request(self, method, url, **kwargs):
+        if url.endswith(f'/databases/{DATABASE_ID}/query'):
+            self.queries.append((kwargs.get('params'), kwargs.get('json')))
+            keep = {prop_id for _, prop_id in kwargs.get('params') or []}
+            rows = [
+                dict(row, properties={name: prop for name, prop in row['properties'].items()
+                                      if not keep or prop['id'] in keep})
+                for row in self.rows
+            ]
+            return self.response({'object': 'list', 'results': rows, 'has_more': False, 'next_cursor': None})
+        if url.endswith(f'/databases/{DATABASE_ID}'):
+            return self.response({
+                'object': 'database',
+                'id': DATABASE_ID,
+                'title': rich_text('环境安装'),
+                'parent': {'type': 'page_id', 'page_id': PARENT_PAGE_ID},
+                'properties': {
+                    '开发': {'id': 'title', 'name': '开发', 'type': 'title'},
+                    '环境': {'id': 'env', 'name': '环境', 'type': 'rich_text'},
+                    'Notes': {'id': 'nts', 'name': 'Notes', 'type': 'rich_text'}
+                }
+            })
+        if url.endswith(f'/pages/{PARENT_PAGE_ID}'):
+            return self.response({'object': 'page', 'id': PARENT_PAGE_ID, 'properties': {
+                'title': {'id': 'title', 'type': 'title', 'title': rich_text('New PC')}}})
+        return self.response({'message': 'not found'}, 404)
+
+    @staticmethod
+    def response(data, status=200):
+        response = requests.models.Response()
+        response.status_code = status
+        response._content = json.dumps(data).encode('utf-8')
+        return response
+
+
+class EmbeddedDatabaseRowsTest(unittest.TestCase):
+    """同步的数据库同时内嵌在页面中时，表格复用发现阶段的行，每轮只查询一次"""
+
+    def setUp(self):
+        self.notion = FakeNotion()
+        patches = [
+            mock.patch.object(sync, 'notion_request', self.notion.request),
+            mock.patch.object(sync, 'NOTION_ARCHIVE_DIR', ''),
+            mock.patch.object(sync, 'DATABASE_QUERY_PARTITIONS', 1),
+            mock.patch.object(sync, 'DATABASE_TABLE_SPLIT_ROWS', 0),
+            mock.patch.object(sync, 'CATEGORY_PROPERTIES', ['Status']),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.clear_caches()
+        self.addCleanup(self.clear_caches)
+
+    @staticmethod
+    def clear_caches():
+        sync.database_info_cache.clear()
+        sync.database_rows_cache.clear()
+        sync.database_table_cache.clear()
+
+    def sync_run(self):
+        """模拟一轮同步：发现阶段读取数据库的行，随后渲染父页面中的嵌入表格"""
+        sync.reset_database_rows_cache()
+        rows = sync.get_database_rows(DATABASE_ID)
+        self.assertEqual(len(rows), 2)
+        return sync.convert_database_to_table(DATABASE_ID, '环境安装')
+
+    def assert_one_query_per_run(self, columns):
+        for run in range(1, 3):
+            table = self.sync_run()
+            self.assertEqual(len(self.notion.queries), run)
+            self.assertIn('| Python | ' + ' | '.join(columns) + ' |', table)
+
+    def test_default_columns(self):
+        with mock.patch.object(sync, 'ENABLE_PROPERTY_PROJECTION', True), \
+                mock.patch.object(sync, 'DATABASE_TABLE_PROPERTIES', ''):
+            self.assert_one_query_per_run(['PyCharm', 'a'])
+
+    def test_projection_disabled(self):
+        with mock.patch.object(sync, 'ENABLE_PROPERTY_PROJECTION', False), \
+                mock.patch.object(sync, 'DATABASE_TABLE_PROPERTIES', ''):
+            self.assert_one_query_per_run(['PyCharm', 'a'])
+
+    def test_custom_table_columns(self):
+        with mock.patch.object(sync, 'ENABLE_PROPERTY_PROJECTION', True), \
+                mock.patch.object(sync, 'DATABASE_TABLE_PROPERTIES', '开发,环境'):
+            self.assert_one_query_per_run(['PyCharm'])
+            # 只请求标题和表格列，未显示的 Notes 列不下载
+            self.assertEqual(sorted(prop_id for _, prop_id in self.notion.queries[0][0]), ['env', 'title'])
+
+
+if __name__ == '__main__':
+    unittest.main()